@@ -4,7 +4,12 @@ from app.models.config_model import ConfigModel
 from app.models.app_config_model import AppConfigModel
 import app.user_tools as user_tools
 import app.route_tool as route_tool_module
-from app.utils.tool_utils import build_route_schema
+from app.utils.schema_compaction import (
+    PromptFootprint,
+    compact_tool_schema,
+    prompt_footprint,
+)
+from app.utils.tool_utils import build_route_schema, get_tool_schema_from_tool
 
 
 # Paths to config files
@@ -16,7 +21,9 @@ APP_CONFIG_PATH = os.path.join(
 )
 
 
-def load_agent_configs(path: str) -> list[ConfigModel]:
+def load_agent_configs(
+    path: str, app_config: AppConfigModel | None = None
+) -> list[ConfigModel]:
     """Read agents.json and return a list of ConfigModel with tools attached."""
     agents: list[ConfigModel] = []
     if os.path.exists(path):
@@ -40,9 +47,16 @@ def load_agent_configs(path: str) -> list[ConfigModel]:
                 f"Agent '{cfg.name}' has mismatched lengths for TOOL_NAMES ({len(cfg.TOOL_NAMES)}) "
                 f"and TOOL_SCHEMA_LIST ({len(cfg.TOOL_SCHEMA_LIST)}). They must match."
             )
-    # Collect all agent names and descriptions for dynamic schema
-    all_agent_names = [cfg.name for cfg in agents]
+    # One shared connection cannot change its model on an agent switch
+    models = {cfg.REALTIME_MODEL for cfg in agents}
+    if app_config and app_config.SINGLE_CONNECTION and len(models) > 1:
+        raise ValueError(
+            "SINGLE_CONNECTION requires all agents to use the same "
+            f"REALTIME_MODEL, got: {', '.join(sorted(models))}"
+        )
+    # Collect agent descriptions and allowed targets for the route schemas
     agent_descriptions = {cfg.name: cfg.description or "" for cfg in agents}
+    resolve_route_targets(agents)
     is_single_agent = len(agents) == 1
     for cfg in agents:
         tool_list = []
@@ -58,8 +72,11 @@ def load_agent_configs(path: str) -> list[ConfigModel]:
             )
         # ---------------------------------------------------------
         for tname in cfg.TOOL_NAMES or []:
-            # If only one agent, ignore route tool even if listed
-            if is_single_agent and hasattr(route_tool_module, tname):
+            # If only one agent or no allowed target, ignore route tool even
+            # if listed
+            if (
+                is_single_agent or not cfg.ROUTE_TARGET_LIST
+            ) and hasattr(route_tool_module, tname):
                 continue
             if hasattr(user_tools, tname):
                 tool_list.append(getattr(user_tools, tname))
@@ -79,7 +96,7 @@ def load_agent_configs(path: str) -> list[ConfigModel]:
                     current_agent_field=params["CURRENT_AGENT_FIELD"],
                     target_agent_field=params["TARGET_AGENT_FIELD"],
                     required=params.get("REQUIRED_FIELDS"),
-                    agent_names=all_agent_names,
+                    agent_names=cfg.ROUTE_TARGET_LIST,
                     agent_descriptions=agent_descriptions,
                 )
                 tool_obj.schema = {
@@ -94,9 +111,79 @@ def load_agent_configs(path: str) -> list[ConfigModel]:
                     f"Unknown tool '{tname}' for agent '{cfg.name}'"
                 )
         cfg.TOOL_LIST = tool_list
+        compact_tool_schemas(cfg, app_config)
     return agents
 
 
+def resolve_route_targets(agents: list[ConfigModel]) -> None:
+    """
+    Resolves each agent's ROUTE_TARGETS (agent names or ROUTE_GROUP names)
+    into ROUTE_TARGET_LIST. Without ROUTE_TARGETS every other agent is a
+    target.
+    """
+    names = [cfg.name for cfg in agents]
+    groups: dict[str, list[str]] = {}
+    for cfg in agents:
+        if cfg.ROUTE_GROUP:
+            groups.setdefault(cfg.ROUTE_GROUP, []).append(cfg.name)
+    known = set(names)
+    for cfg in agents:
+        if cfg.ROUTE_TARGETS is None:
+            targets = names
+        else:
+            targets = []
+            for entry in cfg.ROUTE_TARGETS:
+                if entry in known:
+                    targets.append(entry)
+                elif entry in groups:
+                    targets.extend(groups[entry])
+                else:
+                    raise ValueError(
+                        f"Unknown agent or group '{entry}' in ROUTE_TARGETS "
+                        f"of agent '{cfg.name}'"
+                    )
+        cfg.ROUTE_TARGET_LIST = [
+            name for name in dict.fromkeys(targets) if name != cfg.name
+        ]
+
+
+def compact_tool_schemas(
+    cfg: ConfigModel, app_config: AppConfigModel | None
+) -> None:
+    """
+    Pins the agent's own tool schemas (the route tool's differs per agent),
+    compacted when schema compaction is enabled, and records its prompt
+    footprint. The tools keep their full schemas for argument validation.
+    """
+    schemas = cfg.TOOL_SCHEMA_LIST
+    if not schemas:
+        schemas = []
+        for tool in cfg.TOOL_LIST:
+            if tool.schema is None:
+                tool.schema = get_tool_schema_from_tool(tool.func)
+            schemas.append(tool.schema)
+    compacted = None
+    if app_config and (
+        app_config.TOOL_SCHEMA_STRIP
+        or app_config.TOOL_SCHEMA_DEDUPE
+        or app_config.TOOL_DESCRIPTION_MAX_CHARS
+    ):
+        compacted = [
+            compact_tool_schema(
+                schema,
+                strip=app_config.TOOL_SCHEMA_STRIP,
+                dedupe=app_config.TOOL_SCHEMA_DEDUPE,
+                max_description_chars=app_config.TOOL_DESCRIPTION_MAX_CHARS,
+            )
+            for schema in schemas
+        ]
+    if schemas:
+        cfg.TOOL_SCHEMA_LIST = compacted if compacted is not None else schemas
+    PROMPT_FOOTPRINTS[cfg.name] = prompt_footprint(
+        cfg.name, cfg.INSTRUCTIONS, schemas, compacted
+    )
+
+
 def load_app_config(path: str) -> AppConfigModel | None:
     """Read app_config.json and return an AppConfigModel or None if missing."""
     data: dict = {}
@@ -116,9 +203,12 @@ def load_app_config(path: str) -> AppConfigModel | None:
     return AppConfigModel(**data)
 
 
+# Estimated instructions and tool tokens per agent, filled at load
+PROMPT_FOOTPRINTS: dict[str, PromptFootprint] = {}
+
 # Initialize configurations
-AGENTS = load_agent_configs(AGENTS_CONFIG_PATH)
 APP_CONFIG = load_app_config(APP_CONFIG_PATH)
+AGENTS = load_agent_configs(AGENTS_CONFIG_PATH, APP_CONFIG)
 
 
 def get_agent_configs() -> list[ConfigModel]:
@@ -129,3 +219,8 @@ def get_agent_configs() -> list[ConfigModel]:
 def get_app_config() -> AppConfigModel | None:
     """Returns the AppConfigModel loaded from app_config.json."""
     return APP_CONFIG
+
+
+def get_prompt_footprints() -> list[PromptFootprint]:
+    """Returns the per-agent prompt footprint computed at load."""
+    return list(PROMPT_FOOTPRINTS.values())
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -8,4 +8,71 @@ class AppConfigModel(BaseModel):
     EXC_INFO: bool = Field(default=False)
     API_HOST: str = Field(default="0.0.0.0")
     API_PORT: int = Field(default=8000)
+    # Keep one upstream connection per session and switch agents in place
+    SINGLE_CONNECTION: bool = Field(default=False)
+    # Close agents that stay non-current this long (seconds); None disables
+    AGENT_IDLE_TIMEOUT_S: Optional[float] = None
+    # Transcript turns kept to rehydrate a closed agent
+    AGENT_SNAPSHOT_TURNS: int = Field(default=20)
+    # Directory for per-session usage JSONL files; None disables the sink
+    USAGE_LOG_DIR: Optional[str] = None
+    # Send browser messages as binary (UTF-8 JSON) frames instead of text
+    WS_BINARY_FRAMES: bool = Field(default=False)
+    # Keep a session alive this long (seconds) after its websocket drops so
+    # the client can resume it; 0 stops the session immediately
+    WS_RESUME_GRACE_S: float = Field(default=30)
+    # Outbound events kept per session for replay on resume
+    WS_RESUME_BUFFER_SIZE: int = Field(default=256)
+    # Stop sessions whose client never connects, that see no client audio
+    # or text, or that run too long (seconds; None disables)
+    SESSION_CONNECT_TIMEOUT_S: Optional[float] = Field(default=60)
+    SESSION_IDLE_TIMEOUT_S: Optional[float] = Field(default=None)
+    SESSION_MAX_DURATION_S: Optional[float] = Field(default=None)
+    # Upstream reconnection: attempts and backoff bounds (seconds)
+    UPSTREAM_RECONNECT_ATTEMPTS: int = Field(default=5)
+    UPSTREAM_RECONNECT_BASE_S: float = Field(default=0.5)
+    UPSTREAM_RECONNECT_MAX_S: float = Field(default=8.0)
+    # Conversation items kept per agent for replay after a reconnect
+    CONVERSATION_LOG_ITEMS: int = Field(default=100)
+    # Directory for per-session WAV recordings; None disables recording
+    RECORDING_DIR: Optional[str] = None
+    # "split": one mono file per side; "mix": one stereo file
+    RECORDING_MODE: Literal["split", "mix"] = Field(default="split")
+    # Audio chunks buffered for the writer thread before dropping
+    RECORDING_QUEUE_SIZE: int = Field(default=512)
+    # Sample event-loop lag and report slow callbacks per session/agent/event
+    LOOP_MONITOR: bool = Field(default=False)
+    LOOP_LAG_INTERVAL_S: float = Field(default=0.25)
+    SLOW_CALLBACK_MS: float = Field(default=50)
+    # Expose /debug/loop and the /debug/profile sampling profiler
+    DEBUG_ENDPOINTS: bool = Field(default=False)
+    # Cache-Control max-age for /static assets (index.html always revalidates)
+    STATIC_MAX_AGE_S: int = Field(default=3600)
+    # Greeting cache storage (None keeps greetings in memory only) and
+    # lifetime of a cached greeting (seconds)
+    GREETING_CACHE_DIR: Optional[str] = Field(default=None)
+    GREETING_CACHE_TTL_S: float = Field(default=86400)
+    # Merge consecutive audio deltas of one item for up to this many ms
+    # (None sends every delta as it arrives) or this many PCM bytes
+    AUDIO_COALESCE_MS: Optional[float] = Field(default=None)
+    AUDIO_COALESCE_MAX_BYTES: int = Field(default=9600)
+    # Directory for exported transcripts, tool calls and agent switches
+    # (rotating JSONL files); None disables the export
+    EXPORT_DIR: Optional[str] = None
+    # Records buffered before new ones are dropped, records per batch and
+    # the longest a record waits before being written (seconds)
+    EXPORT_BUFFER_SIZE: int = Field(default=10000)
+    EXPORT_BATCH_SIZE: int = Field(default=500)
+    EXPORT_FLUSH_INTERVAL_S: float = Field(default=1.0)
+    # Start a new export file after this many MB or seconds
+    EXPORT_ROTATE_MB: float = Field(default=64)
+    EXPORT_ROTATE_INTERVAL_S: float = Field(default=3600)
+    # Gzip-compress export files (.jsonl.gz)
+    EXPORT_COMPRESS: bool = Field(default=False)
+    # Tool schema compaction at config load: collapse whitespace and drop
+    # empty or name-only descriptions, drop sentences a parameter repeats
+    # from its tool, and cap descriptions (chars; None keeps them whole)
+    TOOL_SCHEMA_STRIP: bool = Field(default=False)
+    TOOL_SCHEMA_DEDUPE: bool = Field(default=False)
+    TOOL_DESCRIPTION_MAX_CHARS: Optional[int] = Field(default=None)
     # Additional app-level config fields can be added here
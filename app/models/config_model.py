@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict, ClassVar, Union
+from typing import Any, List, Optional, Dict, ClassVar, Union
 from pydantic import BaseModel, Field, field_validator
 from app.utils.tool_types import UserTool, RouteTool
 
@@ -19,7 +19,18 @@ class ConfigModel(BaseModel):
     SWITCH_NOTIFICATION_MESSAGE: Optional[str] = None
     TOOL_NAMES: Optional[List[str]] = None
     TOOL_LIST: List[Union[UserTool, RouteTool]] = Field(default_factory=list)
-    TOOL_SCHEMA_LIST: Optional[List[Dict[str, str]]] = None
+    TOOL_SCHEMA_LIST: Optional[List[Dict[str, Any]]] = None
+    SERVER_BARGE_IN: bool = False
+    TEXT_ONLY: bool = False
+    # Replay the first reply to INITIAL_USER_MESSAGE / SWITCH_USER_MESSAGE
+    # from the greeting cache instead of requesting a new response
+    GREETING_CACHE: bool = False
+    # Group other agents can name in their ROUTE_TARGETS
+    ROUTE_GROUP: Optional[str] = None
+    # Agents or groups this agent may switch to (None: every other agent)
+    ROUTE_TARGETS: Optional[List[str]] = None
+    # ROUTE_TARGETS resolved to agent names at load
+    ROUTE_TARGET_LIST: List[str] = Field(default_factory=list)
 
     ACCEPTABLE_VOICES: ClassVar[set] = {
         "alloy",
@@ -1,24 +1,49 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from app.routers import session, websocket
+from app.config import get_app_config
+from app.routers import debug, session, static, websocket
 from app.services.websocket_service import WebsocketService
+from app.utils.logging import CustomLogger
+from app.utils.loop_monitor import LoopMonitor
+from app.utils.static_assets import StaticAssetStore
 
 
 class RealtimeAPI(FastAPI):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.setup()
-
+    # FastAPI.__init__ calls setup() once; extend it instead of calling it
+    # again, which loaded everything twice
     def setup(self):
-        # Serve static files (e.g., index.html)
-        self.mount("/static", StaticFiles(directory="static"), name="static")
+        super().setup()
+        app_config = get_app_config()
+
+        # Serve static files (e.g., index.html) from memory, loaded once
+        static_assets = StaticAssetStore(
+            directory="static",
+            logger=CustomLogger("static_assets"),
+            max_age=app_config.STATIC_MAX_AGE_S,
+        )
+        static_assets.load()
+        self.state.static_assets = static_assets
 
         # Create one instance of WebsocketService to share across routers
         ws_service = WebsocketService()
 
         # Store it in app.state so both session.py and websocket.py see the same service
         self.state.ws_service = ws_service
+        self.add_event_handler("shutdown", ws_service.close)
+
+        # Optional event-loop lag sampler and slow-callback detector
+        self.state.loop_monitor = None
+        if app_config.LOOP_MONITOR:
+            loop_monitor = LoopMonitor(
+                logger=CustomLogger("loop_monitor"),
+                lag_interval=app_config.LOOP_LAG_INTERVAL_S,
+                slow_callback_ms=app_config.SLOW_CALLBACK_MS,
+            )
+            self.state.loop_monitor = loop_monitor
+            self.add_event_handler("startup", loop_monitor.start)
+            self.add_event_handler("shutdown", loop_monitor.stop)
 
         # Include routers
+        self.include_router(static.router)
         self.include_router(session.router)
         self.include_router(websocket.router)
+        self.include_router(debug.router)
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.config import get_app_config, get_prompt_footprints
+from app.utils.loop_monitor import sample_stacks
+
+router = APIRouter(prefix="/debug")
+
+
+def _check_enabled() -> None:
+    if not get_app_config().DEBUG_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@router.get("/loop", response_class=JSONResponse)
+async def get_loop_stats(request: Request):
+    """
+    Returns event-loop lag and the most recent slow callbacks.
+    """
+    _check_enabled()
+    monitor = request.app.state.loop_monitor
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="LOOP_MONITOR is off")
+    return monitor.stats()
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def get_profile(
+    seconds: float = Query(5.0, gt=0, le=60),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+):
+    """
+    Samples the event-loop thread for `seconds` and returns a collapsed-stack
+    profile (one "frame;frame;frame count" line per stack).
+    """
+    _check_enabled()
+    thread_id = threading.get_ident()
+    lines = await asyncio.to_thread(
+        sample_stacks, thread_id, seconds, interval_ms / 1000
+    )
+    return "\n".join(lines) + "\n"
+
+
+@router.get("/prompt", response_class=JSONResponse)
+async def get_prompt_footprint():
+    """
+    Returns the estimated per-agent tokens of instructions and tool schemas
+    sent with every response, before and after schema compaction.
+    """
+    _check_enabled()
+    footprints = [f.to_dict() for f in get_prompt_footprints()]
+    return {
+        "agents": footprints,
+        "total_tokens": sum(f["total_tokens"] for f in footprints),
+    }
@@ -1,19 +1,11 @@
-from fastapi import APIRouter, Query, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
 from app.config import get_agent_configs
+from app.utils.metrics import metrics
 
 router = APIRouter()
 
 
-@router.get("/", response_class=HTMLResponse)
-async def serve_index():
-    """
-    Returns index.html at the root `/`
-    """
-    with open("static/index.html", "r", encoding="utf-8") as f:
-        return f.read()
-
-
 @router.get("/agents", response_class=JSONResponse)
 async def get_agents():
     """
@@ -23,13 +15,37 @@ async def get_agents():
     return [{"name": a.name, "tools": a.TOOL_NAMES or []} for a in agents]
 
 
+@router.get("/usage", response_class=JSONResponse)
+async def get_usage(session_id: str = Query(None), request: Request = None):
+    """
+    Returns token and audio usage for a session (per agent and per tool),
+    or totals across active sessions when no session_id is given.
+    """
+    ws_service = request.app.state.ws_service
+    usage = ws_service.get_usage(session_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="Unknown session_id")
+    return usage
+
+
+@router.get("/metrics", response_class=JSONResponse)
+async def get_metrics():
+    """
+    Returns process-wide counters and timings (e.g. upstream reconnects).
+    """
+    return metrics.to_dict()
+
+
 @router.post("/start_session")
-async def start_session(request: Request):
+async def start_session(
+    text_only: bool = Query(False), request: Request = None
+):
     """
-    Calls ws_service.start_session() -> spawns agent.connect() in background
+    Calls ws_service.start_session() -> spawns agent.connect() in background.
+    text_only=true starts every agent of the session without audio.
     """
     ws_service = request.app.state.ws_service
-    return await ws_service.start_session()
+    return await ws_service.start_session(text_only=text_only)
 
 
 @router.post("/stop_session")
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException, Request
+
+router = APIRouter()
+
+# Cross-origin isolation lets the page share its playback ring buffer
+# with the audio worklet (SharedArrayBuffer)
+ISOLATION_HEADERS = {
+    "Cross-Origin-Opener-Policy": "same-origin",
+    "Cross-Origin-Embedder-Policy": "require-corp",
+}
+
+
+def _serve(request: Request, name: str):
+    response = request.app.state.static_assets.response(request, name)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
+
+
+@router.api_route("/", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_index(request: Request):
+    """
+    Returns index.html at the root `/` from memory
+    """
+    response = _serve(request, "index.html")
+    response.headers.update(ISOLATION_HEADERS)
+    return response
+
+
+@router.api_route(
+    "/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False
+)
+async def serve_static(path: str, request: Request):
+    """
+    Serves files of the static directory from memory
+    """
+    return _serve(request, path)
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, WebSocket
+from fastapi import APIRouter, Query, WebSocket
 from starlette.websockets import WebSocketDisconnect
 
 router = APIRouter()
 
 
 @router.websocket("/ws/audio/{session_id}")
-async def websocket_audio_endpoint(websocket: WebSocket, session_id: str):
+async def websocket_audio_endpoint(
+    websocket: WebSocket,
+    session_id: str,
+    events: str = Query(None),
+    last_seq: int = Query(None),
+):
+    # events: optional comma-separated subscription set (see README)
+    # last_seq: resume a detached session after this event seq
     ws_service = websocket.app.state.ws_service
 
     try:
-        await ws_service.handle_websocket(websocket, session_id)
+        await ws_service.handle_websocket(
+            websocket, session_id, events, last_seq
+        )
     except WebSocketDisconnect:
         pass
@@ -1,5 +1,19 @@
 import asyncio
-from typing import Any, Tuple, Dict, List, Optional, Union
+import random
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Tuple,
+    Dict,
+    List,
+    Optional,
+    Union,
+)
 from logging import Logger
 from openai import AsyncOpenAI
 from openai.resources.beta.realtime.realtime import AsyncRealtimeConnection
@@ -11,6 +25,8 @@ from app.utils.openai_utils import (
     send_user_message,
     extract_event_details,
     create_tool_input_output_items,
+    create_history_message_item,
+    send_conversation_items,
 )
 from app.utils.tool_utils import (
     validate_schema_list,
@@ -19,8 +35,42 @@ from app.utils.tool_utils import (
     handle_user_tool_call,
     handle_route_tool_call,
     format_string,
+    start_tool_prefetch,
+    discard_tool_prefetch,
 )
-from app.utils.tool_types import UserTool, RouteTool
+from app.utils.greeting_cache import CachedGreeting, GreetingCache
+from app.utils.metrics import metrics
+from app.utils.partial_json import PartialJSONObjectParser
+from app.utils.tool_types import UserTool, RouteTool, ToolPrefetch
+from app.utils.upstream_sender import AUDIO_APPEND, UpstreamSender
+from app.utils.usage import UsageTracker, b64_decoded_len
+
+# PCM16 mono at 24 kHz, the Realtime API default output format
+AUDIO_BYTES_PER_MS = 48
+
+# Unsent events not worth resending on a new connection: buffered audio is
+# stale, the session is configured again on connect and the rest refer to
+# the old connection's response
+STALE_AFTER_RECONNECT = {
+    AUDIO_APPEND,
+    "input_audio_buffer.commit",
+    "input_audio_buffer.clear",
+    "session.update",
+    "conversation.item.truncate",
+    "response.cancel",
+}
+
+# handler(event_type, payload) registered with OpenAIRealtimeAgent.on()
+EventHandler = Callable[[str, Any], Awaitable[None]]
+
+
+@dataclass
+class AgentSnapshot:
+    """Compact state kept for an agent whose connection was closed."""
+
+    agent_name: str
+    transcript: List[Tuple[str, str]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
 
 
 class OpenAIRealtimeAgent:
@@ -28,6 +78,7 @@ class OpenAIRealtimeAgent:
     def __init__(
         self,
         model: str,
+        name: Optional[str] = None,
         client: Optional[AsyncOpenAI] = None,
         temperature: Optional[float] = None,
         voice: Optional[str] = None,
@@ -41,9 +92,21 @@ class OpenAIRealtimeAgent:
         initial_user_message: Optional[str] = None,
         switch_user_message: Optional[str] = None,
         switch_notification_message: Optional[str] = "Agent switched",
+        server_barge_in: bool = False,
+        text_only: bool = False,
+        history: Optional[List[Tuple[str, str]]] = None,
+        transcript_limit: int = 20,
+        usage_tracker: Optional[UsageTracker] = None,
+        reconnect_attempts: int = 5,
+        reconnect_base_delay: float = 0.5,
+        reconnect_max_delay: float = 8.0,
+        conversation_log_limit: int = 100,
+        greeting_cache: Optional[GreetingCache] = None,
+        greeting_version: Optional[str] = None,
         logger: Optional[Logger] = None,
     ) -> None:
         self.model = model
+        self.name = name or model
         self.temperature = temperature
         self.voice = voice
         self.client = client or AsyncOpenAI()
@@ -51,6 +114,7 @@ class OpenAIRealtimeAgent:
         self.system_prompt = system_prompt
         self.switch_prompt = switch_prompt
         self.connection: Optional[AsyncRealtimeConnection] = None
+        self.sender: Optional[UpstreamSender] = None
         self.session = None
         self.connected = asyncio.Event()
         self.logger = logger or CustomLogger(__name__)
@@ -60,21 +124,113 @@ class OpenAIRealtimeAgent:
         self.initial_user_message = initial_user_message
         self.switch_user_message = switch_user_message
         self.switch_notification_message = switch_notification_message
+        # Barge-in state: audio delivered downstream for the playing item
+        self.server_barge_in = server_barge_in
+        self.response_in_progress = False
+        self.audio_item_id: Optional[str] = None
+        self.audio_item_bytes = 0
+        self.audio_item_started_at = 0.0
+        self.cancelled_audio_items: set = set()
+        # Text-only sessions skip voice, transcription and VAD setup
+        self.text_only = text_only
+        # Recent (role, text) turns, used to rehydrate a closed agent
+        self.transcript: deque = deque(maxlen=transcript_limit)
+        # Compact log of conversation items (text turns and tool calls),
+        # replayed into a new upstream connection
+        self.conversation_log: deque = deque(maxlen=conversation_log_limit)
+        # Events a failed connection never wrote, resent after reconnecting,
+        # and the task closing a connection whose writes failed
+        self.unsent_events: List[Dict[str, Any]] = []
+        self.abort_task: Optional[asyncio.Task] = None
+        # Upstream reconnection policy (jittered exponential backoff)
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.closing = False
+        # The voice is fixed once the model has produced audio
+        self.audio_emitted = False
+        # Usage accounting; responses requested by a tool result are
+        # attributed to that tool
+        self.usage_tracker = usage_tracker
+        self.pending_tool_name: Optional[str] = None
+        self.response_tool_name: Optional[str] = None
+        # Outbound event handlers by event type, and the handlers of events
+        # without one
+        self.event_handlers: Dict[str, List[EventHandler]] = {}
+        self.fallback_handlers: List[EventHandler] = []
+        # Upstream event type -> handler; other events are dispatched as-is
+        self.upstream_handlers: Dict[str, Callable[[Any], Awaitable[None]]] = {
+            "session.created": self._on_session,
+            "session.updated": self._on_session,
+            "response.created": self._on_response_created,
+            "response.done": self._on_response_done,
+            "response.output_item.added": self._on_output_item_added,
+            "response.function_call_arguments.delta": (
+                self._on_tool_arguments_delta
+            ),
+            "response.function_call_arguments.done": self._on_function_call,
+            "response.audio.delta": self._on_audio_delta,
+            "conversation.item.input_audio_transcription.completed": (
+                self._on_input_transcript
+            ),
+            "response.audio_transcript.delta": self._on_audio_transcript_delta,
+            "response.audio_transcript.done": self._on_audio_transcript_done,
+            "response.text.delta": self._on_text_delta,
+            "response.text.done": self._on_text_done,
+            "input_audio_buffer.speech_started": self._on_speech_started,
+            "input_audio_buffer.speech_stopped": self._on_speech_stopped,
+        }
+        # item_id -> text streamed so far for the response being generated
+        self.response_texts: Dict[str, str] = {}
+        # Greeting cache: greetings awaiting their response, and responses
+        # being captured (response_id -> (key, greeting)); cached replies
+        # are played under local item ids that are never truncated upstream
+        self.greeting_cache = greeting_cache
+        self.greeting_version = greeting_version
+        self.pending_greetings: deque = deque()
+        self.greeting_captures: Dict[str, Tuple[str, CachedGreeting]] = {}
+        self.local_audio_items: set = set()
+        # Speculative tool prefetch: call_id -> streamed arguments / task
+        self.tool_argument_parsers: Dict[
+            str, Tuple[UserTool, PartialJSONObjectParser]
+        ] = {}
+        self.tool_prefetches: Dict[str, ToolPrefetch] = {}
         self.tool_schema_list, self.tool_map = self.build_tools(
             self.tool_objects, tool_schema_list
         )
+        for role, text in history or []:
+            self._log_message(role, text)
+
+    def _log_message(self, role: str, text: Optional[str]) -> None:
+        if not text:
+            return
+        self.transcript.append((role, text))
+        item = create_history_message_item(
+            role=role, text=text, logger=self.logger
+        )
+        if item:
+            self.conversation_log.append(item)
+
+    def _log_tool_items(
+        self, input_item: Dict[str, Any], output_item: Dict[str, Any]
+    ) -> None:
+        if input_item and output_item:
+            self.conversation_log.append(input_item)
+            self.conversation_log.append(output_item)
 
     async def _handle_user_tool(
         self,
         tool: UserTool,
         arguments: str,
         call_id: str,
-        conn: AsyncRealtimeConnection,
+        sender: UpstreamSender,
     ) -> None:
+        self.tool_argument_parsers.pop(call_id, None)
         result_str = await handle_user_tool_call(
             tool_obj=tool,
             arguments=arguments,
             logger=self.logger,
+            prefetch=self.tool_prefetches.pop(call_id, None),
         )
         input_item, output_item = create_tool_input_output_items(
             call_id=call_id,
@@ -83,12 +239,23 @@ class OpenAIRealtimeAgent:
             tool_output=result_str,
             logger=self.logger,
         )
-        await send_tool_call_results(
+        self.pending_tool_name = tool.name
+        self._log_tool_items(input_item, output_item)
+        send_tool_call_results(
             input_item=input_item,
             output_item=output_item,
-            connection=conn,
+            sender=sender,
             logger=self.logger,
         )
+        await self._dispatch(
+            "tool_result",
+            {
+                "tool": tool.name,
+                "call_id": call_id,
+                "arguments": arguments,
+                "output": result_str,
+            },
+        )
 
     async def _handle_route_tool(
         self,
@@ -96,7 +263,7 @@ class OpenAIRealtimeAgent:
         arguments: str,
         call_id: str,
         agent_switch_message: str,
-        conn: AsyncRealtimeConnection,
+        sender: UpstreamSender,
     ) -> Dict[str, Any]:
         (
             result_str,
@@ -116,47 +283,122 @@ class OpenAIRealtimeAgent:
                 tool_output=result_str,
                 logger=self.logger,
             )
-            await send_tool_call_results(
+            self.pending_tool_name = tool.name
+            self._log_tool_items(input_item, output_item)
+            send_tool_call_results(
                 input_item=input_item,
                 output_item=output_item,
-                connection=conn,
+                sender=sender,
                 logger=self.logger,
             )
-
+            await self._dispatch(
+                "tool_result",
+                {
+                    "tool": tool.name,
+                    "call_id": call_id,
+                    "arguments": arguments,
+                    "output": result_str,
+                },
+            )
             return None
         return parsed_args
 
+    def _track_tool_call(self, item: Any) -> None:
+        """
+        Starts parsing the streamed arguments of a prefetch-enabled tool call.
+        """
+        if getattr(item, "type", None) != "function_call":
+            return
+        tool = self.tool_map.get(item.name)
+        if isinstance(tool, UserTool) and tool.prefetch_keys:
+            self.tool_argument_parsers[item.call_id] = (
+                tool,
+                PartialJSONObjectParser(),
+            )
+
+    def _feed_tool_arguments(self, call_id: str, delta: str) -> None:
+        """
+        Feeds an arguments delta and fires the prefetch once all of the
+        tool's prefetch keys are complete.
+        """
+        entry = self.tool_argument_parsers.get(call_id)
+        if entry is None:
+            return
+        tool, parser = entry
+        parser.feed(delta)
+        if all(key in parser.fields for key in tool.prefetch_keys):
+            del self.tool_argument_parsers[call_id]
+            args = {key: parser.fields[key] for key in tool.prefetch_keys}
+            self.tool_prefetches[call_id] = start_tool_prefetch(
+                tool_obj=tool, args=args, logger=self.logger
+            )
+
+    def _record_response_usage(self, response: Any) -> None:
+        tool_name = self.response_tool_name
+        self.response_tool_name = None
+        if not self.usage_tracker:
+            return
+        usage = self.usage_tracker.record_response(
+            agent_name=self.name,
+            response_id=getattr(response, "id", None),
+            usage=getattr(response, "usage", None),
+            tool_name=tool_name,
+        )
+        self.logger.info(
+            f"Usage [{self.name}]: {usage.input_tokens} in / "
+            f"{usage.output_tokens} out tokens"
+        )
+
+    def _discard_tool_prefetches(self) -> None:
+        self.tool_argument_parsers.clear()
+        for prefetch in self.tool_prefetches.values():
+            discard_tool_prefetch(prefetch, self.logger)
+        self.tool_prefetches.clear()
+
     async def notify_switch(
         self, input_item: str, output_item: str, request_response: bool
     ) -> None:
         """
         Notify the server about a switch in the agent.
         """
+        self._log_tool_items(input_item, output_item)
+        await self.connected.wait()
+        if not self.sender:
+            self.logger.error(
+                "Cannot notify switch: connection not established"
+            )
+            return
         if request_response:
-            await send_tool_call_results(
+            self.pending_tool_name = input_item.get("name")
+            send_tool_call_results(
                 input_item=input_item,
                 output_item=output_item,
-                connection=self.connection,
+                sender=self.sender,
                 logger=self.logger,
             )
         else:
-            await send_tool_call_results_without_response_request(
+            send_tool_call_results_without_response_request(
                 input_item=input_item,
                 output_item=output_item,
-                connection=self.connection,
+                sender=self.sender,
                 logger=self.logger,
             )
 
     async def update_agent_instructions(
         self, arguments: Dict[str, Any]
-    ) -> None:
+    ) -> Optional[Tuple[str, CachedGreeting]]:
+        """
+        Applies the switch prompt and sends the switch greeting. Returns
+        (item_id, greeting) when the greeting was served from the cache and
+        must be played by the caller.
+        """
         # Ensure connection is established before updating session
         await self.connected.wait()
         if not self.connection:
             self.logger.error(
                 "Cannot update instructions: connection not established"
             )
-            return
+            return None
         if self.switch_prompt:
             self.logger.info("Updating agent instructions")
             formatted_switch_prompt = format_string(
@@ -165,117 +407,503 @@ class OpenAIRealtimeAgent:
             updated_instructions = (
                 self.system_prompt + "\n" + formatted_switch_prompt
             )
-            await self.connection.session.update(
-                session={"instructions": updated_instructions}
+            self.sender.send(
+                {
+                    "type": "session.update",
+                    "session": {"instructions": updated_instructions},
+                }
             )
             if self.switch_user_message:
-                await self.send_message(
-                    text=self.switch_user_message, message_type="user"
+                return await self.greet(self.switch_user_message)
+        return None
+
+    def _greeting_key(self, text: str) -> str:
+        # Switch greetings are keyed on the unformatted switch prompt
+        return GreetingCache.key(
+            self.greeting_version,
+            self.name,
+            self.model,
+            self.voice,
+            self.text_only,
+            text,
+        )
+
+    async def greet(self, text: str) -> Optional[Tuple[str, CachedGreeting]]:
+        """
+        Sends a greeting prompt. With a greeting cache, a cached reply is
+        inserted into the conversation without requesting a response and
+        returned as (item_id, greeting) for local playback; on a miss the
+        reply is requested as usual and captured for the cache.
+        """
+        if self.greeting_cache is None:
+            await self.send_message(text=text, message_type="user")
+            return None
+        key = self._greeting_key(text)
+        greeting = await self.greeting_cache.get(key)
+        if greeting is None or not self.sender:
+            self.pending_greetings.append(
+                (key, CachedGreeting(prompt=text, transcript=""))
+            )
+            await self.send_message(text=text, message_type="user")
+            return None
+        self.logger.info(f"Serving cached greeting for agent {self.name}")
+        self._log_message("user", text)
+        self._log_message("assistant", greeting.transcript)
+        send_conversation_items(
+            items=[
+                create_user_message_item(input_text=text, logger=self.logger),
+                create_history_message_item(
+                    "assistant", greeting.transcript, logger=self.logger
+                ),
+            ],
+            sender=self.sender,
+            logger=self.logger,
+        )
+        item_id = f"greeting_{uuid.uuid4().hex[:16]}"
+        self.local_audio_items.add(item_id)
+        return item_id, greeting
+
+    def _capture_greeting_event(self, event: Any) -> None:
+        """
+        Binds a new response to the oldest pending greeting and collects
+        the audio and transcript of responses being captured.
+        """
+        if event.type == "response.created":
+            if self.pending_greetings:
+                self.greeting_captures[event.response.id] = (
+                    self.pending_greetings.popleft()
+                )
+            return
+        capture = self.greeting_captures.get(event.response_id)
+        if capture is None:
+            return
+        greeting = capture[1]
+        match event.type:
+            case "response.audio.delta":
+                greeting.audio_deltas.append(event.delta)
+            case "response.audio_transcript.done":
+                greeting.transcript = event.transcript
+            case "response.text.done":
+                greeting.transcript = event.text
+
+    async def _store_greeting(self, response: Any) -> None:
+        """
+        Caches a captured greeting if its response completed with a plain
+        message (no tool call).
+        """
+        capture = self.greeting_captures.pop(response.id, None)
+        if capture is None:
+            return
+        key, greeting = capture
+        outputs = getattr(response, "output", None) or []
+        if (
+            response.status != "completed"
+            or not greeting.transcript
+            or any(getattr(o, "type", None) != "message" for o in outputs)
+        ):
+            return
+        greeting.created_at = time.time()
+        await self.greeting_cache.put(key, greeting)
+        self.logger.info(f"Cached greeting for agent {self.name}")
+
+    async def load_profile(
+        self,
+        temperature: Optional[float] = None,
+        voice: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        switch_prompt: Optional[str] = "",
+        tools: Optional[List[Union[UserTool, RouteTool]]] = None,
+        tool_schema_list: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str = "auto",
+        switch_user_message: Optional[str] = None,
+        switch_notification_message: Optional[str] = "Agent switched",
+        server_barge_in: bool = False,
+        text_only: bool = False,
+        turn_detection: Optional[Dict[str, Any]] = None,
+        input_audio_transcript_config: Optional[Dict[str, Any]] = None,
+        name: Optional[str] = None,
+        greeting_cache: Optional[GreetingCache] = None,
+        greeting_version: Optional[str] = None,
+        model: Optional[str] = None,
+        **_: Any,
+    ) -> None:
+        """
+        Re-targets the live connection to another agent's configuration
+        with a single session.update, keeping the conversation history.
+        The API only accepts a voice change before the model has produced
+        audio, so later voice changes are skipped, and the connection keeps
+        its model (config load rejects agents with different models).
+        """
+        await self.connected.wait()
+        if not self.connection:
+            self.logger.error(
+                "Cannot load profile: connection not established"
+            )
+            return
+        if model and model != self.model:
+            self.logger.warning(
+                f"Agent {name} uses model {model}, but the shared "
+                f"connection keeps {self.model}"
+            )
+        self.name = name or self.name
+        self.temperature = temperature
+        self.system_prompt = system_prompt
+        self.switch_prompt = switch_prompt
+        self.tool_objects = tools or []
+        self.tool_choice = tool_choice
+        self.switch_user_message = switch_user_message
+        self.switch_notification_message = switch_notification_message
+        self.server_barge_in = server_barge_in
+        self.greeting_cache = greeting_cache
+        self.greeting_version = greeting_version
+        self.tool_schema_list, self.tool_map = self.build_tools(
+            self.tool_objects, tool_schema_list
+        )
+        update_params = {
+            "instructions": self.system_prompt or "",
+            "tools": self.tool_schema_list,
+            "tool_choice": (
+                self.tool_choice if self.tool_schema_list else "none"
+            ),
+        }
+        if self.temperature:
+            update_params["temperature"] = self.temperature
+        if voice and voice != self.voice:
+            if self.audio_emitted:
+                self.logger.info(
+                    f"Keeping voice {self.voice}: audio already produced"
                 )
+            else:
+                self.voice = voice
+                update_params["voice"] = voice
+        if text_only != self.text_only:
+            self.text_only = text_only
+            self.turn_detection = turn_detection
+            self.input_audio_transcript_config = input_audio_transcript_config
+            update_params.update(self._modality_params())
+        self.sender.send({"type": "session.update", "session": update_params})
+
+    def _modality_params(self) -> Dict[str, Any]:
+        """
+        Session parameters that depend on whether the agent handles audio.
+        """
+        if self.text_only:
+            return {
+                "modalities": ["text"],
+                "turn_detection": None,
+                "input_audio_transcription": None,
+            }
+        params: Dict[str, Any] = {"modalities": ["text", "audio"]}
+        if self.turn_detection:
+            params["turn_detection"] = self.turn_detection
+        if self.input_audio_transcript_config:
+            params["input_audio_transcription"] = (
+                self.input_audio_transcript_config
+            )
+        return params
 
-    async def connect(self):
+    def on(self, event_type: Optional[str], handler: EventHandler) -> None:
+        """
+        Registers an async handler(event_type, payload) for an event type,
+        or, with event_type None, for every event that has no handler of
+        its own. Events nobody handles are dropped after a dict lookup.
+        """
+        if event_type is None:
+            self.fallback_handlers.append(handler)
+        else:
+            self.event_handlers.setdefault(event_type, []).append(handler)
+
+    async def _dispatch(self, event_type: str, payload: Any) -> None:
+        handlers = self.event_handlers.get(event_type, self.fallback_handlers)
+        for handler in handlers:
+            try:
+                await handler(event_type, payload)
+            except Exception as e:
+                self.logger.error(f"Error in {event_type} handler: {e}")
+
+    async def run(
+        self, on_event: Optional[Callable[[str], None]] = None
+    ) -> None:
+        """
+        Receives upstream events for the lifetime of the agent and
+        dispatches them to the handlers registered with on(). When the
+        upstream connection fails or closes unexpectedly it is re-opened
+        with jittered exponential backoff; the session config is re-applied
+        and the conversation log replayed into the new connection.
+
+        on_event, if given, is called with each upstream event type before
+        it is handled and with "upstream_receive" after.
+        """
+        attempt = 0
+        lost_at: Optional[float] = None
+        connected_at: Optional[float] = None
+
+        async def on_connected() -> None:
+            nonlocal lost_at, connected_at
+            if lost_at is not None:
+                restore_s = time.monotonic() - lost_at
+                metrics.increment("upstream_reconnects")
+                metrics.observe("upstream_restore_seconds", restore_s)
+                self.logger.info(
+                    f"Upstream connection restored in {restore_s:.2f}s "
+                    f"after {attempt} attempt(s)"
+                )
+                await self._dispatch(
+                    "upstream_restored",
+                    {"attempts": attempt, "restore_s": restore_s},
+                )
+            lost_at = None
+            connected_at = time.monotonic()
+
+        while True:
+            try:
+                await self._connect_once(on_connected, on_event)
+                error = None
+            except Exception as e:
+                error = e
+            if self.closing:
+                return
+            self._reset_connection_state()
+            metrics.increment("upstream_disconnects")
+            if lost_at is None:
+                lost_at = time.monotonic()
+            # Only a connection that stayed up resets the retry budget, so a
+            # server that drops every new connection is not retried forever
+            if (
+                connected_at is not None
+                and lost_at - connected_at >= self.reconnect_max_delay
+            ):
+                attempt = 0
+            connected_at = None
+            if attempt >= self.reconnect_attempts:
+                metrics.increment("upstream_reconnect_failures")
+                self.logger.error(
+                    f"Upstream connection lost, giving up after {attempt} "
+                    f"attempt(s): {error}"
+                )
+                # Unblock callers waiting for a connection
+                self.connected.set()
+                await self._dispatch(
+                    "error", f"Upstream connection lost: {error}"
+                )
+                return
+            delay = random.uniform(
+                0,
+                min(
+                    self.reconnect_max_delay,
+                    self.reconnect_base_delay * 2**attempt,
+                ),
+            )
+            attempt += 1
+            self.logger.warning(
+                f"Upstream connection lost ({error or 'closed'}), "
+                f"reconnecting in {delay:.2f}s (attempt {attempt})"
+            )
+            await self._dispatch(
+                "upstream_reconnecting",
+                {"attempt": attempt, "delay": delay},
+            )
+            await asyncio.sleep(delay)
+            if self.closing:
+                return
+
+    def _reset_connection_state(self) -> None:
+        """
+        Drops per-connection state; in-flight responses do not survive a
+        reconnect.
+        """
+        if self.sender:
+            self._keep_unsent(self.sender.close())
+            self.sender = None
+        self.connection = None
+        self.connected.clear()
+        self.response_in_progress = False
+        self.audio_item_id = None
+        self.cancelled_audio_items.clear()
+        self.pending_tool_name = None
+        self.response_tool_name = None
+        self.pending_greetings.clear()
+        self.greeting_captures.clear()
+        self.response_texts.clear()
+        self._discard_tool_prefetches()
+
+    async def _connect_once(
+        self,
+        on_connected: Callable[[], Awaitable[None]],
+        on_event: Optional[Callable[[str], None]] = None,
+    ) -> None:
         async with self.client.beta.realtime.connect(model=self.model) as conn:
             self.connection = conn
-            self.connected.set()
+            # All writes to this connection go through one ordered queue
+            self.sender = UpstreamSender(
+                conn, self.logger, on_error=self._on_send_error
+            )
 
             update_params = {}
             if self.temperature:
                 update_params["temperature"] = self.temperature
-            if self.voice:
-                update_params["voice"] = self.voice
-            if self.turn_detection:
-                update_params["turn_detection"] = self.turn_detection
+            if self.text_only:
+                update_params.update(self._modality_params())
+            else:
+                if self.voice:
+                    update_params["voice"] = self.voice
+                if self.turn_detection:
+                    update_params["turn_detection"] = self.turn_detection
+                if self.input_audio_transcript_config:
+                    update_params["input_audio_transcription"] = (
+                        self.input_audio_transcript_config
+                    )
             if self.system_prompt:
                 update_params["instructions"] = self.system_prompt
-            if self.input_audio_transcript_config:
-                update_params["input_audio_transcription"] = (
-                    self.input_audio_transcript_config
-                )
             if self.tool_schema_list:
                 update_params["tools"] = self.tool_schema_list
                 update_params["tool_choice"] = self.tool_choice
             if update_params:
-                await conn.session.update(session=update_params)
-
-            if self.initial_user_message:
-                await self.send_message(self.initial_user_message, "user")
+                self.sender.send(
+                    {"type": "session.update", "session": update_params}
+                )
 
-            response_audio_items: Dict[str, str] = {}
-            response_text_items: Dict[str, str] = {}
-            input_transcript = None
+            restoring = bool(self.conversation_log or self.unsent_events)
+            if restoring:
+                # Rehydrated or reconnected agent: replay the conversation
+                # and what the lost connection never sent, and skip the
+                # greeting
+                self._replay_conversation()
+            # Callers queue behind the session setup and restored history
+            self.connected.set()
+            await on_connected()
+            if not restoring and self.initial_user_message:
+                greeting = await self.greet(self.initial_user_message)
+                if greeting:
+                    await self._dispatch("cached_greeting", greeting)
 
+            handlers = self.upstream_handlers
             async for event in conn:
-                self.logger.info("Event type: " + event.type)
-                self.logger.debug(f"Event: {str(event)}")
                 evt_type = event.type
+                self.logger.debug(f"Event type: {evt_type}")
+                if on_event:
+                    on_event(evt_type)
+                handler = handlers.get(evt_type)
+                if handler is None:
+                    await self._dispatch(evt_type, event)
+                else:
+                    await handler(event)
+                if on_event:
+                    on_event("upstream_receive")
+
+    async def _on_session(self, event: Any) -> None:
+        self.session = event.session
+
+    async def _on_response_created(self, event: Any) -> None:
+        if self.pending_greetings:
+            self._capture_greeting_event(event)
+        self.response_in_progress = True
+        self.response_tool_name = self.pending_tool_name
+        self.pending_tool_name = None
+        await self._dispatch(event.type, event)
+
+    async def _on_response_done(self, event: Any) -> None:
+        self.response_in_progress = False
+        self._record_response_usage(event.response)
+        if self.greeting_captures:
+            await self._store_greeting(event.response)
+        self.cancelled_audio_items.clear()
+        self._discard_tool_prefetches()
+        await self._dispatch(event.type, event)
+
+    async def _on_output_item_added(self, event: Any) -> None:
+        self._track_tool_call(event.item)
+        await self._dispatch(event.type, event)
+
+    async def _on_tool_arguments_delta(self, event: Any) -> None:
+        self._feed_tool_arguments(event.call_id, event.delta)
+
+    async def _on_audio_delta(self, event: Any) -> None:
+        # Late deltas of a barged-in item are dropped here
+        self.audio_emitted = True
+        if self.greeting_captures:
+            self._capture_greeting_event(event)
+        if self.usage_tracker:
+            self.usage_tracker.record_audio_received(
+                self.name, b64_decoded_len(event.delta)
+            )
+        if event.item_id not in self.cancelled_audio_items:
+            await self._dispatch("audio_delta", event)
+
+    async def _on_input_transcript(self, event: Any) -> None:
+        transcript = getattr(event, "transcript", "")
+        self._log_message("user", transcript)
+        await self._dispatch("input_audio_transcript", transcript)
+
+    async def _on_audio_transcript_delta(self, event: Any) -> None:
+        text = self.response_texts.get(event.item_id, "") + event.delta
+        self.response_texts[event.item_id] = text
+        await self._dispatch("response_audio_transcript_delta", text)
+
+    async def _on_audio_transcript_done(self, event: Any) -> None:
+        self.response_texts.pop(event.item_id, None)
+        self._log_message("assistant", event.transcript)
+        if self.greeting_captures:
+            self._capture_greeting_event(event)
+        await self._dispatch(event.type, event)
+
+    async def _on_text_delta(self, event: Any) -> None:
+        text = self.response_texts.get(event.item_id, "") + event.delta
+        self.response_texts[event.item_id] = text
+        await self._dispatch("response_text_delta", text)
+
+    async def _on_text_done(self, event: Any) -> None:
+        self.response_texts.pop(event.item_id, None)
+        self._log_message("assistant", event.text)
+        if self.greeting_captures:
+            self._capture_greeting_event(event)
+        await self._dispatch(event.type, event)
+
+    async def _on_function_call(self, event: Any) -> None:
+        call_id, tool_name, arguments = extract_event_details(
+            event=event, logger=self.logger
+        )
+        tool = find_tool_by_name(
+            tools=self.tool_objects,
+            tool_name=tool_name,
+            logger=self.logger,
+        )
+        if isinstance(tool, UserTool):
+            await self._handle_user_tool(
+                tool=tool,
+                arguments=arguments,
+                call_id=call_id,
+                sender=self.sender,
+            )
+        elif isinstance(tool, RouteTool):
+            parsed_args = await self._handle_route_tool(
+                tool=tool,
+                arguments=arguments,
+                call_id=call_id,
+                agent_switch_message=self.switch_notification_message,
+                sender=self.sender,
+            )
+            input_item, output_item = create_tool_input_output_items(
+                call_id=call_id,
+                tool_name=tool.name,
+                arguments=arguments,
+                tool_output=self.switch_notification_message,
+                logger=self.logger,
+            )
+            payload = {
+                "input_item": input_item,
+                "output_item": output_item,
+                "params": parsed_args,
+            }
+            await self._dispatch("agent_switched", payload)
+
+    async def _on_speech_started(self, event: Any) -> None:
+        if self.server_barge_in:
+            await self.barge_in()
+        await self._dispatch("user_audio_started", event)
 
-                match evt_type:
-                    case "session.created":
-                        self.session = event.session
-                    case "session.updated":
-                        self.session = event.session
-                    case "response.audio.delta":
-                        yield ("audio_delta", event)
-                    case (
-                        "conversation.item.input_audio_transcription.completed"
-                    ):
-                        input_transcript = getattr(event, "transcript", "")
-                        yield ("input_audio_transcript", input_transcript)
-                    case "response.audio_transcript.delta":
-                        old_text = response_audio_items.get(event.item_id, "")
-                        new_text = old_text + event.delta
-                        response_audio_items[event.item_id] = new_text
-                        yield ("response_audio_transcript_delta", new_text)
-                    case "response.text.delta":
-                        old_text = response_text_items.get(event.item_id, "")
-                        new_text = old_text + event.delta
-                        response_text_items[event.item_id] = new_text
-                        yield ("response_text_delta", new_text)
-                    case "response.function_call_arguments.done":
-                        call_id, tool_name, arguments = extract_event_details(
-                            event=event, logger=self.logger
-                        )
-                        tool = find_tool_by_name(
-                            tools=self.tool_objects,
-                            tool_name=tool_name,
-                            logger=self.logger,
-                        )
-                        if isinstance(tool, UserTool):
-                            await self._handle_user_tool(
-                                tool=tool,
-                                arguments=arguments,
-                                call_id=call_id,
-                                conn=conn,
-                            )
-                        elif isinstance(tool, RouteTool):
-                            parsed_args = await self._handle_route_tool(
-                                tool=tool,
-                                arguments=arguments,
-                                call_id=call_id,
-                                agent_switch_message=self.switch_notification_message,
-                                conn=conn,
-                            )
-                            input_item, output_item = (
-                                create_tool_input_output_items(
-                                    call_id=call_id,
-                                    tool_name=tool.name,
-                                    arguments=arguments,
-                                    tool_output=self.switch_notification_message,
-                                    logger=self.logger,
-                                )
-                            )
-                            payload = {
-                                "input_item": input_item,
-                                "output_item": output_item,
-                                "params": parsed_args,
-                            }
-                            yield ("agent_switched", payload)
-                    case "input_audio_buffer.speech_started":
-                        yield ("user_audio_started", event)
-                    case "input_audio_buffer.speech_stopped":
-                        yield ("user_audio_stopped", event)
-                    case _:
-                        yield (evt_type, event)
+    async def _on_speech_stopped(self, event: Any) -> None:
+        await self._dispatch("user_audio_stopped", event)
 
     async def send_audio(self, audio_b64: str) -> None:
         """
@@ -284,8 +912,20 @@ class OpenAIRealtimeAgent:
         Parameters:
             audio_b64 (str): Base64-encoded audio data as a UTF-8 string.
         """
-        await self.connected.wait()
-        await self.connection.input_audio_buffer.append(audio=audio_b64)
+        if self.text_only:
+            return
+        # Never wait out a reconnect: audio captured meanwhile is stale, and
+        # the replayed conversation log restores the context
+        if not self.connected.is_set() or not self.sender:
+            metrics.increment("upstream_audio_dropped_disconnected")
+            return
+        self.sender.send(
+            {"type": "input_audio_buffer.append", "audio": audio_b64}
+        )
+        if self.usage_tracker:
+            self.usage_tracker.record_audio_sent(
+                self.name, b64_decoded_len(audio_b64)
+            )
 
     async def check_connection(self) -> bool:
         await self.connected.wait()
@@ -302,12 +942,18 @@ class OpenAIRealtimeAgent:
             type (str): The type of the message.
         """
         if message_type == "user":
+            self._log_message("user", text)
+            if not self.sender:
+                self.logger.error(
+                    "Cannot send message: connection not established"
+                )
+                return
             user_item = create_user_message_item(
                 input_text=text, logger=self.logger
             )
-            await send_user_message(
+            send_user_message(
                 conversation_item=user_item,
-                connection=self.connection,
+                sender=self.sender,
                 logger=self.logger,
             )
 
@@ -317,10 +963,120 @@ class OpenAIRealtimeAgent:
         """
         Truncates the assistant's audio buffer.
         """
-        await self.connection.conversation.item.truncate(
-            audio_end_ms=audio_end_ms,
-            content_index=0,
-            item_id=item_id,
+        if item_id in self.local_audio_items:
+            # Cached greeting audio has no upstream audio item to truncate
+            return
+        if not self.sender:
+            raise RuntimeError("Connection not established.")
+        self.sender.send(
+            {
+                "type": "conversation.item.truncate",
+                "audio_end_ms": audio_end_ms,
+                "content_index": 0,
+                "item_id": item_id,
+            }
+        )
+
+    def record_audio_delivered(self, item_id: str, n_bytes: int) -> None:
+        """
+        Records assistant audio bytes delivered downstream for an item.
+        """
+        if item_id != self.audio_item_id:
+            self.audio_item_id = item_id
+            self.audio_item_bytes = 0
+            self.audio_item_started_at = asyncio.get_running_loop().time()
+        self.audio_item_bytes += n_bytes
+
+    async def barge_in(self) -> None:
+        """
+        Cancels the in-flight response and truncates the playing item at the
+        audio delivered so far, capped by the wall-clock time since its first
+        chunk (the client cannot have played more than either).
+        """
+        try:
+            if self.response_in_progress:
+                self.logger.info("Barge-in: cancelling in-flight response")
+                self.sender.send({"type": "response.cancel"})
+            item_id = self.audio_item_id
+            if not item_id:
+                return
+            self.audio_item_id = None
+            self.cancelled_audio_items.add(item_id)
+            elapsed_ms = int(
+                (
+                    asyncio.get_running_loop().time()
+                    - self.audio_item_started_at
+                )
+                * 1000
+            )
+            audio_end_ms = min(
+                self.audio_item_bytes // AUDIO_BYTES_PER_MS, elapsed_ms
+            )
+            self.logger.info(
+                f"Barge-in: truncating item {item_id} at {audio_end_ms}ms"
+            )
+            await self.truncate_assistant_audio(
+                audio_end_ms=audio_end_ms, item_id=item_id
+            )
+        except Exception as e:
+            self.logger.warning(f"Error handling barge-in: {e}")
+
+    def _replay_conversation(self) -> None:
+        items = list(self.conversation_log)
+        self.logger.info(f"Replaying {len(items)} conversation items")
+        send_conversation_items(
+            items=items, sender=self.sender, logger=self.logger
+        )
+        metrics.increment("upstream_replayed_items", len(items))
+        if self.unsent_events:
+            self.logger.info(
+                f"Resending {len(self.unsent_events)} unsent upstream events"
+            )
+            self.sender.send_many(self.unsent_events)
+            metrics.increment(
+                "upstream_resent_events", len(self.unsent_events)
+            )
+            self.unsent_events = []
+
+    def _keep_unsent(self, events: List[Dict[str, Any]]) -> None:
+        """
+        Keeps the unsent events that still make sense on a new connection.
+        Stale audio, session updates (re-sent on connect) and events about
+        the old connection's items or response are dropped, as are items
+        the conversation replay already restores.
+        """
+        for event in events:
+            evt_type = event.get("type")
+            if evt_type in STALE_AFTER_RECONNECT or (
+                evt_type == "conversation.item.create"
+                and event.get("item") in self.conversation_log
+            ):
+                continue
+            self.unsent_events.append(event)
+
+    def _on_send_error(self, error: Exception) -> None:
+        # A failed write means the connection is gone; closing it ends the
+        # receive loop and starts the reconnect path in run()
+        conn = self.connection
+        if conn is None or self.closing:
+            return
+        self.logger.warning(
+            f"Upstream write failed, closing the connection: {error}"
+        )
+        self.abort_task = asyncio.create_task(self._abort_connection(conn))
+
+    async def _abort_connection(self, conn: AsyncRealtimeConnection) -> None:
+        try:
+            await conn.close()
+        except Exception as e:
+            self.logger.warning(f"Error closing failed connection: {e}")
+
+    def snapshot(self, agent_name: str) -> AgentSnapshot:
+        """
+        Returns the compact state needed to rehydrate this agent later.
+        """
+        return AgentSnapshot(
+            agent_name=agent_name, transcript=list(self.transcript)
         )
 
     @staticmethod
@@ -354,6 +1110,11 @@ class OpenAIRealtimeAgent:
         """
         Closes the connection to the server.
         """
+        self.closing = True
+        self.unsent_events = []
+        if self.sender:
+            self.sender.close()
+            self.sender = None
         if self.connection:
             await self.connection.close()
             self.connection = None
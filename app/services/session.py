@@ -0,0 +1,126 @@
+import asyncio
+from collections import deque
+from logging import Logger
+from typing import Any, Deque, Dict, FrozenSet, Optional, Tuple, Union
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+from app.services.agent import AgentSnapshot, OpenAIRealtimeAgent
+from app.utils.audio_coalescer import AudioCoalescer
+from app.utils.recording import SessionRecorder
+from app.utils.usage import UsageTracker
+
+
+class Session:
+    """
+    Everything one client session owns: its agents and their event tasks,
+    the attached websocket, the current agent, subscriptions, hibernation
+    state, usage, recorder and the resume buffer. close() is the single
+    teardown path.
+    """
+
+    __slots__ = (
+        "session_id",
+        "text_only",
+        "agents",
+        "tasks",
+        "websocket",
+        "current_agent",
+        "subscriptions",
+        "hibernation_timers",
+        "hibernation_tasks",
+        "snapshots",
+        "usage",
+        "recorder",
+        "audio_coalescer",
+        "outbox",
+        "seq",
+        "closed",
+    )
+
+    def __init__(
+        self,
+        session_id: str,
+        usage: UsageTracker,
+        outbox_size: int,
+        text_only: bool = False,
+        recorder: Optional[SessionRecorder] = None,
+    ) -> None:
+        self.session_id = session_id
+        # Started in text-only mode (overrides agent TEXT_ONLY)
+        self.text_only = text_only
+        # agent_name -> agent; agents may share one connection in
+        # single-connection mode
+        self.agents: Dict[str, OpenAIRealtimeAgent] = {}
+        # agent_name -> task running the agent
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.websocket: Optional[WebSocket] = None
+        self.current_agent: Optional[str] = None
+        # Event types the client subscribed to (None: the defaults)
+        self.subscriptions: Optional[FrozenSet[str]] = None
+        # agent_name -> pending hibernation timer / running hibernation /
+        # snapshot of a hibernated agent
+        self.hibernation_timers: Dict[str, asyncio.TimerHandle] = {}
+        self.hibernation_tasks: Dict[str, asyncio.Task] = {}
+        self.snapshots: Dict[str, AgentSnapshot] = {}
+        self.usage = usage
+        self.recorder = recorder
+        # Merges downstream audio deltas (None: sent as they arrive)
+        self.audio_coalescer: Optional[AudioCoalescer] = None
+        # Recent outbound (seq, encoded frame) for resume, and the last
+        # sequence number assigned
+        self.outbox: Deque[Tuple[int, Union[str, bytes]]] = deque(
+            maxlen=outbox_size
+        )
+        self.seq = 0
+        self.closed = False
+
+    def is_current(self, agent: OpenAIRealtimeAgent) -> bool:
+        current = self.current_agent
+        return current is not None and self.agents.get(current) is agent
+
+    async def close(self, logger: Logger) -> Dict[str, Any]:
+        """
+        Tears the session down in a fixed order: timers and buffered
+        audio, agents (closed concurrently), tasks, websocket, usage sink,
+        recorder. Returns the final usage and recording stats.
+        """
+        self.closed = True
+        for timer in self.hibernation_timers.values():
+            timer.cancel()
+        self.hibernation_timers.clear()
+        for task in self.hibernation_tasks.values():
+            task.cancel()
+        self.hibernation_tasks.clear()
+        if self.audio_coalescer:
+            self.audio_coalescer.close()
+        agents = set(self.agents.values())
+        results = await asyncio.gather(
+            *(agent.close() for agent in agents), return_exceptions=True
+        )
+        for e in results:
+            if isinstance(e, Exception):
+                logger.warning(f"Error closing agent connection: {e}")
+        self.agents.clear()
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+        self.snapshots.clear()
+        ws, self.websocket = self.websocket, None
+        if ws is not None and ws.client_state == WebSocketState.CONNECTED:
+            try:
+                await ws.close()
+            except RuntimeError as e:
+                logger.warning(
+                    f"Error closing websocket during stop_session: {e}"
+                )
+        self.outbox.clear()
+        result: Dict[str, Any] = {
+            "status": "Session stopped",
+            "usage": self.usage.to_dict(),
+        }
+        if self.usage.sink:
+            await self.usage.sink.close()
+        if self.recorder:
+            await asyncio.to_thread(self.recorder.close)
+            result["recording"] = self.recorder.stats()
+        return result
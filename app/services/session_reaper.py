@@ -0,0 +1,178 @@
+import asyncio
+import heapq
+import time
+from dataclasses import dataclass
+from logging import Logger
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.utils.metrics import metrics
+
+CONNECT = "connect"
+DETACHED = "detached"
+IDLE = "idle"
+MAX_DURATION = "max_duration"
+
+
+@dataclass
+class _SessionTimes:
+    created_at: float
+    last_activity: float
+    attached: bool = False
+    ever_attached: bool = False
+    # Bumped on every attach/detach so stale detach deadlines are ignored
+    attach_gen: int = 0
+
+
+class SessionReaper:
+    """
+    Tears down sessions that outlive their timeouts: never connected
+    (connect_timeout), detached without resuming (resume_grace), without
+    client audio or text (idle_timeout), or running too long
+    (max_duration). All deadlines live in one heap served by a single task;
+    activity only stamps a time and idle deadlines are re-armed lazily when
+    they come due, so touch() costs no heap operation.
+    """
+
+    def __init__(
+        self,
+        on_expire: Callable[[str, str], Awaitable[None]],
+        logger: Logger,
+        connect_timeout: Optional[float] = None,
+        resume_grace: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        max_duration: Optional[float] = None,
+    ) -> None:
+        self.on_expire = on_expire
+        self.logger = logger
+        self.connect_timeout = connect_timeout
+        self.resume_grace = resume_grace
+        self.idle_timeout = idle_timeout
+        self.max_duration = max_duration
+        self.sessions: Dict[str, _SessionTimes] = {}
+        # (deadline, session_id, kind, attach_gen)
+        self.heap: List[Tuple[float, str, str, int]] = []
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def _push(
+        self, deadline: float, session_id: str, kind: str, gen: int = 0
+    ) -> None:
+        earliest = self.heap[0][0] if self.heap else None
+        heapq.heappush(self.heap, (deadline, session_id, kind, gen))
+        if earliest is None or deadline < earliest:
+            self.wakeup.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def track(self, session_id: str) -> None:
+        now = time.monotonic()
+        self.sessions[session_id] = _SessionTimes(
+            created_at=now, last_activity=now
+        )
+        if self.connect_timeout:
+            self._push(now + self.connect_timeout, session_id, CONNECT)
+        if self.idle_timeout:
+            self._push(now + self.idle_timeout, session_id, IDLE)
+        if self.max_duration:
+            self._push(now + self.max_duration, session_id, MAX_DURATION)
+
+    def forget(self, session_id: str) -> None:
+        # Heap entries of a forgotten session are dropped when they pop
+        self.sessions.pop(session_id, None)
+
+    def touch(self, session_id: str) -> None:
+        times = self.sessions.get(session_id)
+        if times:
+            times.last_activity = time.monotonic()
+
+    def attach(self, session_id: str) -> None:
+        times = self.sessions.get(session_id)
+        if times:
+            times.attached = True
+            times.ever_attached = True
+            times.attach_gen += 1
+
+    def detach(self, session_id: str) -> None:
+        """
+        Starts the resume grace period of a session whose client went away.
+        """
+        times = self.sessions.get(session_id)
+        if times is None:
+            return
+        times.attached = False
+        times.attach_gen += 1
+        if self.resume_grace is not None:
+            self._push(
+                time.monotonic() + self.resume_grace,
+                session_id,
+                DETACHED,
+                times.attach_gen,
+            )
+
+    def _expired_reason(
+        self, entry: Tuple[float, str, str, int], now: float
+    ) -> Optional[str]:
+        """
+        Returns why a due entry ends its session, or None if it is stale
+        (re-arming idle deadlines that were pushed back by activity).
+        """
+        _, session_id, kind, gen = entry
+        times = self.sessions.get(session_id)
+        if times is None:
+            return None
+        if kind == CONNECT:
+            return None if times.ever_attached else "connect_timeout"
+        if kind == DETACHED:
+            stale = times.attached or gen != times.attach_gen
+            return None if stale else "resume_grace"
+        if kind == IDLE:
+            deadline = times.last_activity + self.idle_timeout
+            if deadline > now:
+                self._push(deadline, session_id, IDLE)
+                return None
+            return "idle_timeout"
+        return "max_duration"
+
+    async def _run(self) -> None:
+        while self.heap:
+            self.wakeup.clear()
+            now = time.monotonic()
+            expired: Dict[str, str] = {}
+            while self.heap and self.heap[0][0] <= now:
+                entry = heapq.heappop(self.heap)
+                reason = self._expired_reason(entry, now)
+                if reason and entry[1] not in expired:
+                    expired[entry[1]] = reason
+            if expired:
+                await asyncio.gather(
+                    *(
+                        self._reap(sid, reason)
+                        for sid, reason in expired.items()
+                    )
+                )
+                continue
+            if not self.heap:
+                break
+            try:
+                await asyncio.wait_for(
+                    self.wakeup.wait(), self.heap[0][0] - now
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def _reap(self, session_id: str, reason: str) -> None:
+        times = self.sessions.pop(session_id, None)
+        if times is None:
+            return
+        lifetime = time.monotonic() - times.created_at
+        self.logger.info(
+            f"Reaping session {session_id} ({reason}) after {lifetime:.0f}s"
+        )
+        start = time.monotonic()
+        try:
+            await self.on_expire(session_id, reason)
+        except Exception as e:
+            self.logger.error(f"Error reaping session {session_id}: {e}")
+        metrics.increment("sessions_reaped")
+        metrics.increment(f"sessions_reaped_{reason}")
+        metrics.observe("session_reap_seconds", time.monotonic() - start)
+        metrics.observe("reaped_session_lifetime_seconds", lifetime)
@@ -1,82 +1,337 @@
 import asyncio
+import time
 import uuid
-import base64
-from typing import Dict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Dict,
+    Iterable,
+    Optional,
+    Set,
+    Tuple,
+)
 from starlette.websockets import WebSocketState
 from fastapi import WebSocket
-from app.config import get_agent_configs
-from app.services.agent import OpenAIRealtimeAgent
+from app.config import (
+    get_agent_configs,
+    get_app_config,
+    get_prompt_footprints,
+)
+from app.services.agent import OpenAIRealtimeAgent, EventHandler
 from app.utils.logging import CustomLogger
 from app.utils.openai_utils import get_client
+from app.utils.json_codec import (
+    encode_frame,
+    send_frame,
+    send_json,
+    receive_json,
+)
+from app.utils.loop_monitor import set_loop_step
+from app.utils.recording import SessionRecorder, create_recorder
+from app.utils.audio_coalescer import AudioCoalescer
+from app.utils.export_sink import create_export_sink
+from app.utils.jsonl_sink import JsonlSink
+from app.utils.greeting_cache import (
+    CachedGreeting,
+    GreetingCache,
+    config_version,
+)
+from app.services.session import Session
+from app.services.session_reaper import SessionReaper
+from app.utils.usage import (
+    UsageStats,
+    UsageTracker,
+    b64_decoded_len,
+)
 import app.route_tool as route_tool_module
 
 logger = CustomLogger(__name__)
 
+# Events forwarded when the client does not declare a subscription set:
+# exactly what the bundled static/index.html consumes
+DEFAULT_EVENT_SUBSCRIPTIONS = frozenset(
+    {
+        "input_audio_transcript",
+        "response_audio_transcript_delta",
+        "response_text_delta",
+        "audio_delta",
+        "user_audio_started",
+    }
+)
+# Always processed: they carry protocol state or server-side logic
+ALWAYS_FORWARDED_EVENTS = frozenset(
+    {"agent_switched", "error", "cached_greeting"}
+)
+# Event types with a session handler or deliberately ignored; any other
+# upstream event is forwarded as unhandled_event when subscribed to
+HANDLED_EVENT_TYPES = DEFAULT_EVENT_SUBSCRIPTIONS | {
+    "response.content_part.done",
+    "response.output_item.done",
+    "response.done",
+    "tool_result",
+}
+# Upstream events exported for analytics besides tool_result
+EXPORTED_TRANSCRIPT_EVENTS = frozenset(
+    {
+        "input_audio_transcript",
+        "response.audio_transcript.done",
+        "response.text.done",
+    }
+)
+# Audio events short-circuited for text-only agents
+AUDIO_EVENT_TYPES = frozenset(
+    {
+        "audio_delta",
+        "user_audio_started",
+        "user_audio_stopped",
+        "input_audio_transcript",
+    }
+)
+
 
 class WebsocketService:
     def __init__(self):
-        # session_id -> {agent_name: agent_instance}
-        self.active_sessions: Dict[str, Dict[str, OpenAIRealtimeAgent]] = {}
-        # session_id -> {agent_name: task}
-        self.agent_tasks: Dict[str, Dict[str, asyncio.Task]] = {}
-        # session_id -> websocket
-        self.session_websockets: Dict[str, WebSocket] = {}
-        # session_id -> current agent name
-        self.session_current_agent: Dict[str, str] = {}
+        # session_id -> session state
+        self.sessions: Dict[str, Session] = {}
         # cache agent configs by name
         self.agent_configs = {
             agent.name: agent for agent in get_agent_configs()
         }
+        # agent_name -> agents it may switch to, checked on every switch
+        self.route_targets = {
+            name: frozenset(cfg.ROUTE_TARGET_LIST)
+            for name, cfg in self.agent_configs.items()
+        }
         self.client = get_client()
+        for footprint in get_prompt_footprints():
+            logger.info(
+                f"Agent {footprint.agent} prompt footprint: "
+                f"~{footprint.instructions_tokens} instruction tokens, "
+                f"~{footprint.tools_tokens} tool tokens "
+                f"({footprint.tools_tokens_uncompacted} uncompacted)"
+            )
+        app_config = get_app_config()
+        self.single_connection = app_config.SINGLE_CONNECTION
+        self.agent_idle_timeout = app_config.AGENT_IDLE_TIMEOUT_S
+        self.agent_snapshot_turns = app_config.AGENT_SNAPSHOT_TURNS
+        self.usage_log_dir = app_config.USAGE_LOG_DIR
+        self.ws_binary_frames = app_config.WS_BINARY_FRAMES
+        self.ws_resume_grace = app_config.WS_RESUME_GRACE_S
+        self.ws_resume_buffer_size = app_config.WS_RESUME_BUFFER_SIZE
+        self.upstream_reconnect_attempts = (
+            app_config.UPSTREAM_RECONNECT_ATTEMPTS
+        )
+        self.upstream_reconnect_base = app_config.UPSTREAM_RECONNECT_BASE_S
+        self.upstream_reconnect_max = app_config.UPSTREAM_RECONNECT_MAX_S
+        self.conversation_log_items = app_config.CONVERSATION_LOG_ITEMS
+        self.recording_dir = app_config.RECORDING_DIR
+        self.recording_mode = app_config.RECORDING_MODE
+        self.recording_queue_size = app_config.RECORDING_QUEUE_SIZE
+        self.audio_coalesce_ms = app_config.AUDIO_COALESCE_MS
+        self.audio_coalesce_max_bytes = app_config.AUDIO_COALESCE_MAX_BYTES
+        # Transcripts, tool calls and agent switches of every session
+        self.export_sink = create_export_sink(
+            app_config.EXPORT_DIR,
+            logger=logger,
+            max_buffer=app_config.EXPORT_BUFFER_SIZE,
+            batch_size=app_config.EXPORT_BATCH_SIZE,
+            flush_interval=app_config.EXPORT_FLUSH_INTERVAL_S,
+            rotate_bytes=int(app_config.EXPORT_ROTATE_MB * 1024 * 1024),
+            rotate_interval=app_config.EXPORT_ROTATE_INTERVAL_S,
+            compress=app_config.EXPORT_COMPRESS,
+        )
+        # Greeting replies shared by the agents that enable GREETING_CACHE
+        self.greeting_cache = GreetingCache(
+            logger=logger,
+            directory=app_config.GREETING_CACHE_DIR,
+            ttl=app_config.GREETING_CACHE_TTL_S,
+        )
+        self.agent_config_versions = {
+            name: config_version(cfg)
+            for name, cfg in self.agent_configs.items()
+        }
+        # Connect, resume-grace, idle and max-duration deadlines
+        self.reaper = SessionReaper(
+            on_expire=self._expire_session,
+            logger=logger,
+            connect_timeout=app_config.SESSION_CONNECT_TIMEOUT_S,
+            resume_grace=self.ws_resume_grace,
+            idle_timeout=app_config.SESSION_IDLE_TIMEOUT_S,
+            max_duration=app_config.SESSION_MAX_DURATION_S,
+        )
+        # Fire-and-forget tasks, referenced until they finish
+        self.background_tasks: Set[asyncio.Task] = set()
+
+    def _spawn(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
 
-    async def start_session(self):
+    async def start_session(self, text_only: bool = False):
         session_id = str(uuid.uuid4())
         logger.info(f"Creating session {session_id}")
-        self.active_sessions[session_id] = {}
-        self.agent_tasks[session_id] = {}
         agent_names = list(self.agent_configs.keys())
         if not agent_names:
             raise RuntimeError("No agents configured")
+        sink = None
+        if self.usage_log_dir:
+            sink = JsonlSink(
+                self.usage_log_dir,
+                logger=logger,
+                name="usage",
+                filename=f"{session_id}.jsonl",
+            )
+        recorder = None
+        if not text_only:
+            recorder = create_recorder(
+                self.recording_dir,
+                session_id,
+                logger=logger,
+                mode=self.recording_mode,
+                queue_size=self.recording_queue_size,
+            )
+        session = Session(
+            session_id,
+            usage=UsageTracker(session_id, sink=sink),
+            outbox_size=self.ws_resume_buffer_size,
+            text_only=text_only,
+            recorder=recorder,
+        )
+        if not text_only and self.audio_coalesce_ms:
+            session.audio_coalescer = AudioCoalescer(
+                send=lambda agent, item_id, audio_b64, n_bytes: (
+                    self._send_audio(
+                        session, agent, item_id, audio_b64, n_bytes
+                    )
+                ),
+                budget_ms=self.audio_coalesce_ms,
+                max_bytes=self.audio_coalesce_max_bytes,
+            )
+        self.sessions[session_id] = session
         default_agent = agent_names[0]
-        self.session_current_agent[session_id] = default_agent
+        session.current_agent = default_agent
         # Instantiate the default agent
-        await self._ensure_agent(session_id, default_agent)
+        await self._ensure_agent(session, default_agent)
+        self.reaper.track(session_id)
         # Return session_id and default_agent for frontend
-        return {"session_id": session_id, "default_agent": default_agent}
+        return {
+            "session_id": session_id,
+            "default_agent": default_agent,
+            "text_only": text_only,
+        }
 
     async def stop_session(self, session_id: str):
         logger.info(f"Stopping session {session_id}")
-        if session_id in self.active_sessions:
-            for agent in self.active_sessions[session_id].values():
-                try:
-                    await agent.close()
-                except Exception as e:
-                    logger.warning(f"Error closing agent connection: {e}")
-            del self.active_sessions[session_id]
-        if session_id in self.agent_tasks:
-            for task in self.agent_tasks[session_id].values():
-                task.cancel()
-            del self.agent_tasks[session_id]
-        # Safely remove and close websocket if present
-        ws = self.session_websockets.pop(session_id, None)
-        if ws and ws.client_state == WebSocketState.CONNECTED:
+        self.reaper.forget(session_id)
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return {"status": "Session stopped"}
+        return await session.close(logger)
+
+    async def close(self):
+        """
+        Writes out buffered export records on shutdown.
+        """
+        if self.export_sink:
+            await self.export_sink.close()
+
+    def get_usage(self, session_id: Optional[str] = None):
+        """
+        Returns usage for one session, or totals across active sessions.
+        """
+        if session_id is not None:
+            session = self.sessions.get(session_id)
+            return session.usage.to_dict() if session else None
+        total = UsageStats()
+        for session in self.sessions.values():
+            total.add(session.usage.total)
+        return {"sessions": len(self.sessions), "total": total.to_dict()}
+
+    async def _send(self, websocket: WebSocket, data: Dict[str, Any]):
+        await send_json(websocket, data, binary=self.ws_binary_frames)
+
+    async def _emit(self, session: Session, data: Dict[str, Any]):
+        """
+        Sequences a session event, keeps it in the resume buffer and sends
+        it if a websocket is attached. Events emitted while the client is
+        reconnecting are delivered on resume.
+        """
+        if session.closed:
+            return
+        session.seq += 1
+        data["seq"] = session.seq
+        frame = encode_frame(data, binary=self.ws_binary_frames)
+        session.outbox.append((session.seq, frame))
+        ws = session.websocket
+        if ws is None or ws.client_state != WebSocketState.CONNECTED:
+            return
+        try:
+            await send_frame(ws, frame)
+        except Exception as e:
+            # The client resumes from its last seen seq after reconnecting
+            logger.warning(
+                f"Error sending event for session {session.session_id}: {e}"
+            )
+
+    async def _replay(
+        self, websocket: WebSocket, session: Session, last_seq: int
+    ):
+        """
+        Resends buffered events newer than last_seq, in seq order, until it
+        has caught up with events emitted meanwhile; the caller attaches the
+        websocket only then, so live events cannot overtake replayed ones.
+        Returns False when some of them have already been evicted from the
+        buffer.
+        """
+        sent = last_seq
+        complete = True
+        while sent < session.seq and not session.closed:
+            pending = [(seq, f) for seq, f in session.outbox if seq > sent]
+            if not pending or pending[0][0] > sent + 1:
+                complete = False
+            if not pending:
+                break
+            for seq, frame in pending:
+                await send_frame(websocket, frame)
+                sent = seq
+        return complete
+
+    async def _close_replaced(
+        self, previous_ws: Optional[WebSocket], websocket: WebSocket
+    ) -> None:
+        if (
+            previous_ws is not None
+            and previous_ws is not websocket
+            and previous_ws.client_state == WebSocketState.CONNECTED
+        ):
             try:
-                await ws.close()
+                await previous_ws.close()
             except RuntimeError as e:
-                logger.warning(
-                    f"Error closing websocket during stop_session: {e}"
-                )
-        if session_id in self.session_current_agent:
-            del self.session_current_agent[session_id]
-        return {"status": "Session stopped"}
+                logger.warning(f"Error closing replaced websocket: {e}")
 
-    async def _ensure_agent(self, session_id: str, agent_name: str):
-        if agent_name in self.active_sessions[session_id]:
-            return self.active_sessions[session_id][agent_name]
+    async def _send_events_lost(self, websocket: WebSocket) -> None:
+        await self._send(
+            websocket,
+            {
+                "type": "error",
+                "message": "Some events were lost while reconnecting",
+            },
+        )
+
+    async def _expire_session(self, session_id: str, reason: str) -> None:
+        if session_id in self.sessions:
+            await self.stop_session(session_id)
+
+    def _agent_kwargs(
+        self, session: Session, agent_name: str
+    ) -> Dict[str, Any]:
         cfg = self.agent_configs[agent_name]
-        agent = OpenAIRealtimeAgent(
+        return dict(
+            name=agent_name,
             model=cfg.REALTIME_MODEL,
-            client=self.client,
             temperature=cfg.TEMPERATURE,
             voice=cfg.VOICE,
             turn_detection=cfg.TURN_DETECTION_CONFIG,
@@ -89,104 +344,383 @@ class WebsocketService:
             initial_user_message=cfg.INITIAL_USER_MESSAGE,
             switch_user_message=cfg.SWITCH_USER_MESSAGE,
             switch_notification_message=cfg.SWITCH_NOTIFICATION_MESSAGE,
+            server_barge_in=cfg.SERVER_BARGE_IN,
+            text_only=cfg.TEXT_ONLY or session.text_only,
+            greeting_cache=(
+                self.greeting_cache if cfg.GREETING_CACHE else None
+            ),
+            greeting_version=self.agent_config_versions[agent_name],
+        )
+
+    async def _play_greeting(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        item_id: str,
+        greeting: CachedGreeting,
+    ) -> None:
+        """
+        Sends a cached greeting to the client as if the model had just
+        produced it.
+        """
+        transcript_type = (
+            "response_text_delta"
+            if agent.text_only
+            else "response_audio_transcript_delta"
+        )
+        if self._is_subscribed(session, transcript_type):
+            await self._emit(
+                session,
+                {"type": transcript_type, "text": greeting.transcript},
+            )
+        self._export(
+            session,
+            agent,
+            "assistant_transcript",
+            item_id=item_id,
+            text=greeting.transcript,
+            cached=True,
+        )
+        if agent.text_only:
+            return
+        if session.recorder:
+            for audio_b64 in greeting.audio_deltas:
+                session.recorder.write("agent", audio_b64)
+        if not self._is_subscribed(session, "audio_delta"):
+            return
+        for audio_b64 in greeting.audio_deltas:
+            await self._deliver_audio(session, agent, item_id, audio_b64)
+        if session.audio_coalescer:
+            await session.audio_coalescer.flush()
+
+    def _export(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        record_type: str,
+        **fields: Any,
+    ) -> None:
+        if self.export_sink:
+            self.export_sink.write(
+                {
+                    "ts": time.time(),
+                    "session_id": session.session_id,
+                    "agent": agent.name,
+                    "type": record_type,
+                    **fields,
+                }
+            )
+
+    async def _deliver_audio(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        item_id: str,
+        audio_b64: str,
+    ) -> None:
+        coalescer = session.audio_coalescer
+        if coalescer:
+            await coalescer.add(agent, item_id, audio_b64)
+        else:
+            await self._send_audio(
+                session, agent, item_id, audio_b64, b64_decoded_len(audio_b64)
+            )
+
+    async def _send_audio(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        item_id: str,
+        audio_b64: str,
+        n_bytes: int,
+    ) -> None:
+        await self._emit(
+            session,
+            {"type": "audio_delta", "audio": audio_b64, "item_id": item_id},
+        )
+        agent.record_audio_delivered(item_id, n_bytes)
+
+    def _set_current_agent(self, session: Session, agent_name: str) -> None:
+        """
+        Makes agent_name current and schedules hibernation of the agent it
+        replaces once it has been idle for AGENT_IDLE_TIMEOUT_S.
+        """
+        previous_agent = session.current_agent
+        session.current_agent = agent_name
+        timers = session.hibernation_timers
+        timer = timers.pop(agent_name, None)
+        if timer:
+            timer.cancel()
+        if (
+            self.agent_idle_timeout is None
+            or self.single_connection
+            or not previous_agent
+            or previous_agent == agent_name
+        ):
+            return
+        old_timer = timers.pop(previous_agent, None)
+        if old_timer:
+            old_timer.cancel()
+        timers[previous_agent] = asyncio.get_running_loop().call_later(
+            self.agent_idle_timeout,
+            self._start_hibernation,
+            session,
+            previous_agent,
+        )
+
+    def _start_hibernation(self, session: Session, agent_name: str) -> None:
+        # Tracked so stopping the session cancels a hibernation under way
+        if session.closed:
+            return
+        task = self._spawn(self._hibernate_agent(session, agent_name))
+        session.hibernation_tasks[agent_name] = task
+
+        def forget(done: asyncio.Task) -> None:
+            if session.hibernation_tasks.get(agent_name) is done:
+                del session.hibernation_tasks[agent_name]
+
+        task.add_done_callback(forget)
+
+    async def _hibernate_agent(self, session: Session, agent_name: str):
+        """
+        Closes a non-current agent's upstream connection, keeping only a
+        snapshot to rehydrate it from if it becomes current again.
+        """
+        session.hibernation_timers.pop(agent_name, None)
+        if (
+            session.closed
+            or agent_name not in session.agents
+            or session.current_agent == agent_name
+        ):
+            return
+        agent = session.agents.pop(agent_name)
+        logger.info(
+            f"Hibernating idle agent {agent_name} for session {session.session_id}"
+        )
+        session.snapshots[agent_name] = agent.snapshot(agent_name)
+        try:
+            await agent.close()
+        except Exception as e:
+            logger.warning(f"Error closing idle agent connection: {e}")
+        task = session.tasks.pop(agent_name, None)
+        if task:
+            task.cancel()
+
+    async def _switch_profile(
+        self, session: Session, agent_name: str
+    ) -> OpenAIRealtimeAgent:
+        """
+        Single-connection mode: loads agent_name's configuration onto the
+        session's shared connection.
+        """
+        agent = await self._ensure_agent(session, agent_name)
+        await agent.load_profile(**self._agent_kwargs(session, agent_name))
+        return agent
+
+    async def _ensure_agent(self, session: Session, agent_name: str):
+        agents = session.agents
+        if agent_name in agents:
+            return agents[agent_name]
+        if session.closed:
+            raise RuntimeError(f"Session {session.session_id} is stopped")
+        if self.single_connection and agents:
+            # Every agent of the session maps to the one shared connection
+            agent = next(iter(agents.values()))
+            agents[agent_name] = agent
+            return agent
+        snapshot = session.snapshots.pop(agent_name, None)
+        if snapshot:
+            logger.info(
+                f"Rehydrating agent {agent_name} for session {session.session_id}"
+            )
+        agent = OpenAIRealtimeAgent(
+            client=self.client,
             logger=logger,
+            history=snapshot.transcript if snapshot else None,
+            transcript_limit=self.agent_snapshot_turns,
+            usage_tracker=session.usage,
+            reconnect_attempts=self.upstream_reconnect_attempts,
+            reconnect_base_delay=self.upstream_reconnect_base,
+            reconnect_max_delay=self.upstream_reconnect_max,
+            conversation_log_limit=self.conversation_log_items,
+            **self._agent_kwargs(session, agent_name),
         )
-        self.active_sessions[session_id][agent_name] = agent
+        agents[agent_name] = agent
+        self._register_agent_handlers(session, agent)
         # Start background event consumer for this agent
-        task = asyncio.create_task(
-            self.consume_agent_events(session_id, agent_name, agent)
+        session.tasks[agent_name] = asyncio.create_task(
+            self.consume_agent_events(session, agent_name, agent)
         )
-        self.agent_tasks[session_id][agent_name] = task
         return agent
 
-    async def handle_websocket(self, websocket, session_id: str):
+    @staticmethod
+    def _set_subscriptions(
+        session: Session, events: Optional[Iterable[str]]
+    ) -> None:
+        """
+        Stores the client's subscription set. Entries are outbound event
+        types, raw upstream event types (e.g. "response.created"),
+        "unhandled_event" for every unhandled upstream event, or "*".
+        """
+        if events is None:
+            session.subscriptions = None
+            return
+        if isinstance(events, str):
+            events = events.split(",")
+        session.subscriptions = frozenset(
+            e.strip() for e in events if e and e.strip()
+        )
+
+    @staticmethod
+    def _is_subscribed(session: Session, evt_type: str) -> bool:
+        subscriptions = session.subscriptions or DEFAULT_EVENT_SUBSCRIPTIONS
+        return (
+            evt_type in subscriptions
+            or evt_type in ALWAYS_FORWARDED_EVENTS
+            or "*" in subscriptions
+            or (
+                evt_type not in HANDLED_EVENT_TYPES
+                and "unhandled_event" in subscriptions
+            )
+        )
+
+    async def handle_websocket(
+        self,
+        websocket,
+        session_id: str,
+        events: Optional[Iterable[str]] = None,
+        last_seq: Optional[int] = None,
+    ):
         logger.info(f"WebSocket connected for session_id={session_id}")
         await websocket.accept()
-        # Send agent_switched event for consistency with frontend expectations
-        default_agent = self.session_current_agent.get(session_id)
-        await websocket.send_json(
-            {
-                "type": "agent_switched",
-                "agent_name": default_agent,
-                "session_id": session_id,
-            }
-        )
-        if session_id not in self.active_sessions:
+        session = self.sessions.get(session_id)
+        if session is None:
             logger.error(f"No such session {session_id}")
-            await websocket.send_json(
-                {"type": "error", "message": "Invalid session_id"}
+            await self._send(
+                websocket, {"type": "error", "message": "Invalid session_id"}
             )
             await websocket.close()
             return
-        self.session_websockets[session_id] = websocket
+        self.reaper.attach(session_id)
+        if events is not None or last_seq is None:
+            self._set_subscriptions(session, events)
+        # A resumed client replaces a socket that has not noticed it is dead.
+        # Events emitted until the replay below has caught up are only
+        # buffered, then the new socket is attached.
+        previous_ws = session.websocket
+        session.websocket = None
+        await self._close_replaced(previous_ws, websocket)
+        if last_seq is None:
+            # Send agent_switched event for consistency with frontend expectations
+            await self._send(
+                websocket,
+                {
+                    "type": "agent_switched",
+                    "agent_name": session.current_agent,
+                    "session_id": session_id,
+                },
+            )
+            if not await self._replay(websocket, session, 0):
+                await self._send_events_lost(websocket)
+        else:
+            logger.info(f"Resuming session {session_id} after seq {last_seq}")
+            await self._send(
+                websocket,
+                {
+                    "type": "session_resumed",
+                    "agent_name": session.current_agent,
+                    "session_id": session_id,
+                    "last_seq": session.seq,
+                },
+            )
+            if not await self._replay(websocket, session, last_seq):
+                await self._send_events_lost(websocket)
+        # No await between the replay catching up and attaching
+        previous_ws = session.websocket
+        session.websocket = websocket
+        await self._close_replaced(previous_ws, websocket)
+        stop_requested = False
         try:
             # Loop until session is stopped or websocket is closed
             while (
-                session_id in self.active_sessions
+                not session.closed
                 and websocket.client_state == WebSocketState.CONNECTED
             ):
                 try:
-                    msg = await websocket.receive_json()
+                    msg = await receive_json(websocket)
                 except Exception as e:
                     logger.info(
                         f"Session {session_id} websocket receive exception: {e}"
                     )
                     break
                 msg_type = msg.get("type")
-                agent_name = msg.get(
-                    "agent_name"
-                ) or self.session_current_agent.get(session_id)
+                set_loop_step(
+                    session_id, session.current_agent, f"client:{msg_type}"
+                )
+                if msg_type == "subscribe":
+                    self._set_subscriptions(session, msg.get("events"))
+                    continue
+                agent_name = msg.get("agent_name") or session.current_agent
                 if not agent_name or agent_name not in self.agent_configs:
-                    await websocket.send_json(
+                    await self._emit(
+                        session,
                         {
                             "type": "error",
                             "message": f"Unknown or missing agent: {agent_name}",
-                        }
+                        },
                     )
                     continue
                 # Guard against session being stopped concurrently
-                if session_id not in self.active_sessions:
+                if session.closed:
                     logger.info(
-                        f"Session {session_id} removed before ensuring agent, exiting loop"
-                    )
-                    break
-                try:
-                    agent = await self._ensure_agent(session_id, agent_name)
-                except KeyError:
-                    logger.info(
-                        f"Session {session_id} no longer active in _ensure_agent, exiting loop"
+                        f"Session {session_id} stopped before ensuring agent, exiting loop"
                     )
                     break
+                agent = await self._ensure_agent(session, agent_name)
                 if msg_type == "switch_agent":
-                    self.session_current_agent[session_id] = agent_name
-                    await websocket.send_json(
+                    previous_agent = session.current_agent
+                    if self.single_connection and agent_name != previous_agent:
+                        await self._switch_profile(session, agent_name)
+                    self._set_current_agent(session, agent_name)
+                    await self._emit(
+                        session,
                         {
                             "type": "agent_switched",
                             "agent_name": agent_name,
                             "session_id": session_id,
-                        }
+                        },
                     )
                 else:
                     match msg_type:
-                        case "audio_chunk":
-                            raw_pcm = base64.b64decode(msg["audio"])
-                            decoded_audio = base64.b64encode(raw_pcm).decode(
-                                "utf-8"
+                        case "audio_chunk" if agent.text_only:
+                            logger.debug(
+                                f"Dropping audio for text-only agent {agent_name}"
                             )
-                            await agent.send_audio(audio_b64=decoded_audio)
+                        case "audio_chunk":
+                            # Forwarded as received; only the recorder decodes
+                            audio_b64 = msg["audio"]
+                            self.reaper.touch(session_id)
+                            await agent.send_audio(audio_b64=audio_b64)
+                            if session.recorder:
+                                session.recorder.write("caller", audio_b64)
+                            n_bytes = b64_decoded_len(audio_b64)
                             logger.debug(
-                                f"Appended {len(raw_pcm)} bytes of PCM for session {session_id} agent {agent_name}"
+                                f"Appended {n_bytes} bytes of PCM for session {session_id} agent {agent_name}"
                             )
                         case "user_input":
                             text = msg.get("text")
+                            self.reaper.touch(session_id)
                             await agent.send_message(
                                 text=text, message_type="user"
                             )
                         case "disconnect":
                             logger.info("Client requested disconnect.")
+                            stop_requested = True
                             break
                         case "user_interrupt":
                             logger.info("Client interrupted the conversation.")
+                            if session.audio_coalescer:
+                                session.audio_coalescer.discard()
                             duration_ms = msg.get("duration_ms")
                             item_id = msg.get("item_id")
                             logger.info(
@@ -203,13 +737,15 @@ class WebsocketService:
                                 f"Unhandled message type: {msg_type}"
                             )
         finally:
-            # Cancel all agent event tasks for this session to avoid background errors
-            if session_id in self.agent_tasks:
-                for task in self.agent_tasks[session_id].values():
-                    task.cancel()
-                del self.agent_tasks[session_id]
-            if self.session_websockets.get(session_id) == websocket:
-                del self.session_websockets[session_id]
+            # Only the attached socket owns the session; a socket replaced by
+            # a resumed connection leaves it alone
+            if session.websocket is websocket:
+                session.websocket = None
+                if stop_requested:
+                    self._spawn(self.stop_session(session_id))
+                elif not session.closed:
+                    logger.info(f"Session {session_id} detached")
+                    self.reaper.detach(session_id)
             if websocket.client_state == WebSocketState.CONNECTED:
                 try:
                     await websocket.close()
@@ -217,161 +753,312 @@ class WebsocketService:
                     logger.warning(f"Error closing websocket in cleanup: {e}")
             logger.info(f"WebSocket closed for session {session_id}")
 
+    def _register_agent_handlers(
+        self, session: Session, agent: OpenAIRealtimeAgent
+    ) -> None:
+        """
+        Registers the session's handlers on an agent. Event types without a
+        handler here (e.g. response.output_item.done) cost the agent a dict
+        lookup; the rest are forwarded as unhandled_event when subscribed
+        to.
+        """
+        coalescer = session.audio_coalescer
+        if coalescer:
+            self._register_coalescer_handlers(coalescer, agent)
+        handlers = {
+            "input_audio_transcript": self._forward_text,
+            "response_audio_transcript_delta": self._forward_text,
+            "response_text_delta": self._forward_text,
+            "audio_delta": self._forward_audio_delta,
+            "user_audio_started": self._forward_user_audio_started,
+            "cached_greeting": self._forward_cached_greeting,
+            "agent_switched": self._switch_agent,
+            "error": self._forward_error,
+        }
+        if self.export_sink:
+            self._register_export_handlers(session, agent)
+        if session.recorder:
+            self._register_recorder_handlers(session.recorder, agent)
+        for evt_type, handler in handlers.items():
+            agent.on(evt_type, self._session_handler(session, agent, handler))
+        forward_unhandled = self._session_handler(
+            session, agent, self._forward_unhandled_event
+        )
+        agent.on(None, forward_unhandled)
+        if self.export_sink:
+            # Exported events with a handler no longer reach the fallback
+            for evt_type in EXPORTED_TRANSCRIPT_EVENTS - handlers.keys():
+                agent.on(evt_type, forward_unhandled)
+
+    @staticmethod
+    def _register_coalescer_handlers(
+        coalescer: AudioCoalescer, agent: OpenAIRealtimeAgent
+    ) -> None:
+        """
+        Sends an agent's buffered audio when its response is done and drops
+        it on barge-in. These run regardless of subscriptions and before the
+        forwarding handlers, so buffered audio never trails the
+        user_audio_started event.
+        """
+
+        async def flush(evt_type: str, payload: Any) -> None:
+            if coalescer.source is agent:
+                await coalescer.flush()
+
+        async def discard(evt_type: str, payload: Any) -> None:
+            if coalescer.source is agent:
+                coalescer.discard()
+
+        agent.on("response.done", flush)
+        agent.on("user_audio_started", discard)
+
+    @staticmethod
+    def _register_recorder_handlers(
+        recorder: SessionRecorder, agent: OpenAIRealtimeAgent
+    ) -> None:
+        """
+        Records an agent's audio as it arrives, whatever the client
+        subscribed to and whether or not the agent is current.
+        """
+
+        async def record(evt_type: str, event: Any) -> None:
+            if agent.text_only:
+                return
+            if isinstance(event.delta, str) and event.delta:
+                recorder.write("agent", event.delta)
+
+        agent.on("audio_delta", record)
+
+    def _register_export_handlers(
+        self, session: Session, agent: OpenAIRealtimeAgent
+    ) -> None:
+        """
+        Exports an agent's final transcripts and tool results, whatever the
+        client subscribed to.
+        """
+
+        async def export_user(evt_type: str, transcript: str) -> None:
+            if transcript:
+                self._export(
+                    session, agent, "user_transcript", text=transcript
+                )
+
+        async def export_assistant(evt_type: str, event: Any) -> None:
+            text = getattr(event, "transcript", None) or getattr(
+                event, "text", None
+            )
+            if text:
+                self._export(
+                    session,
+                    agent,
+                    "assistant_transcript",
+                    item_id=event.item_id,
+                    text=text,
+                )
+
+        async def export_tool(evt_type: str, result: Dict[str, Any]) -> None:
+            self._export(session, agent, "tool_call", **result)
+
+        agent.on("input_audio_transcript", export_user)
+        agent.on("response.audio_transcript.done", export_assistant)
+        agent.on("response.text.done", export_assistant)
+        agent.on("tool_result", export_tool)
+
+    def _session_handler(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        handler: Callable[
+            [str, OpenAIRealtimeAgent, str, Any], Awaitable[None]
+        ],
+    ) -> EventHandler:
+        """
+        Wraps a handler so it only runs for the session's current agent,
+        for events the client subscribed to.
+        """
+
+        async def handle(evt_type: str, payload: Any) -> None:
+            if agent.text_only and evt_type in AUDIO_EVENT_TYPES:
+                return
+            if not self._is_subscribed(
+                session, evt_type
+            ) or not session.is_current(agent):
+                return
+            try:
+                await handler(session, agent, evt_type, payload)
+            except Exception as e:
+                logger.error(f"Error sending event to frontend: {e}")
+                await self._emit(session, {"type": "error", "message": str(e)})
+
+        return handle
+
+    async def _forward_text(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        evt_type: str,
+        text: str,
+    ) -> None:
+        await self._emit(session, {"type": evt_type, "text": text})
+
+    async def _forward_audio_delta(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        evt_type: str,
+        event: Any,
+    ) -> None:
+        audio_b64 = event.delta
+        if not audio_b64 or not isinstance(audio_b64, str):
+            logger.error(
+                f"audio_delta: No valid audio data for agent {agent.name} "
+                f"(type={type(audio_b64)})"
+            )
+            await self._emit(
+                session,
+                {
+                    "type": "error",
+                    "message": f"No valid audio data for agent {agent.name}",
+                },
+            )
+            return
+        await self._deliver_audio(session, agent, event.item_id, audio_b64)
+
+    async def _forward_user_audio_started(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        evt_type: str,
+        event: Any,
+    ) -> None:
+        # With server barge-in the response is already cancelled and
+        # truncated; the client only flushes
+        await self._emit(
+            session,
+            {
+                "type": "user_audio_started",
+                "server_barge_in": agent.server_barge_in,
+            },
+        )
+
+    async def _forward_cached_greeting(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        evt_type: str,
+        greeting: Tuple[str, CachedGreeting],
+    ) -> None:
+        await self._play_greeting(session, agent, *greeting)
+
+    async def _forward_error(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        evt_type: str,
+        payload: Any,
+    ) -> None:
+        logger.error(f"Agent error event: {payload}")
+        error = getattr(payload, "error", None)
+        await self._emit(
+            session,
+            {
+                "type": "error",
+                "message": getattr(error, "message", None) or str(payload),
+            },
+        )
+
+    async def _forward_unhandled_event(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        evt_type: str,
+        payload: Any,
+    ) -> None:
+        if evt_type in HANDLED_EVENT_TYPES:
+            return
+        await self._emit(
+            session,
+            {"type": "unhandled_event", "event": evt_type, "payload": payload},
+        )
+
+    async def _switch_agent(
+        self,
+        session: Session,
+        agent: OpenAIRealtimeAgent,
+        evt_type: str,
+        payload: Dict[str, Any],
+    ) -> None:
+        # Use TARGET_AGENT_FIELD from route_tool_module.schema_params
+        schema_params = getattr(route_tool_module, "schema_params", {})
+        target_agent_field = schema_params.get(
+            "TARGET_AGENT_FIELD", "target_agent"
+        )
+        target_agent = payload["params"].get(target_agent_field)
+        input_item = payload["input_item"]
+        output_item = payload["output_item"]
+        if target_agent not in self.route_targets.get(agent.name, ()):
+            logger.error(
+                f"Invalid target_agent in agent_switched event: {target_agent}"
+                f" (not a route target of {agent.name})"
+            )
+            output_item["output"] = f"Invalid target_agent: {target_agent}"
+            # Notify the previous agent about the error
+            await agent.notify_switch(
+                input_item=input_item,
+                output_item=output_item,
+                request_response=True,
+            )
+            await self._emit(
+                session,
+                {
+                    "type": "error",
+                    "message": f"Invalid target_agent: {target_agent}",
+                },
+            )
+            return
+        new_agent = await self._ensure_agent(session, target_agent)
+        self._set_current_agent(session, target_agent)
+        self._export(
+            session,
+            agent,
+            "agent_switch",
+            target_agent=target_agent,
+            params=payload["params"],
+        )
+        await self._emit(
+            session,
+            {
+                "type": "agent_switched",
+                "agent_name": target_agent,
+                "session_id": session.session_id,
+            },
+        )
+        # Notify the previous agent (the one that called the route tool)
+        await agent.notify_switch(
+            input_item=input_item,
+            output_item=output_item,
+            request_response=False,
+        )
+        if self.single_connection:
+            await self._switch_profile(session, target_agent)
+        greeting = await new_agent.update_agent_instructions(
+            arguments=payload["params"],
+        )
+        if greeting:
+            await self._play_greeting(session, new_agent, *greeting)
+
     async def consume_agent_events(
-        self, session_id: str, agent_name: str, agent: OpenAIRealtimeAgent
+        self, session: Session, agent_name: str, agent: OpenAIRealtimeAgent
     ):
+        session_id = session.session_id
         logger.info(
             f"consume_agent_events -> start for session {session_id} agent {agent_name}"
         )
-        async for evt_type, payload in agent.connect():
-            logger.info(
-                f"Session {session_id} [{agent_name}] => Event: {evt_type}"
+        await agent.run(
+            on_event=lambda evt_type: set_loop_step(
+                session_id, agent_name, evt_type
             )
-            ws = self.session_websockets.get(session_id)
-            if ws and self.session_current_agent.get(session_id) == agent_name:
-                try:
-                    match evt_type:
-                        case "input_audio_transcript":
-                            await ws.send_json(
-                                {
-                                    "type": "input_audio_transcript",
-                                    "text": payload,
-                                }
-                            )
-                        case "response_audio_transcript_delta":
-                            await ws.send_json(
-                                {
-                                    "type": "response_audio_transcript_delta",
-                                    "text": payload,
-                                }
-                            )
-                        case "response_text_delta":
-                            await ws.send_json(
-                                {
-                                    "type": "response_text_delta",
-                                    "text": payload,
-                                }
-                            )
-                        case "audio_delta":
-                            audio_b64 = getattr(payload, "delta", None)
-                            if not audio_b64 or not isinstance(audio_b64, str):
-                                logger.error(
-                                    f"audio_delta: No valid audio data for agent {agent_name} (type={type(audio_b64)}, "
-                                    f"value={audio_b64})"
-                                )
-                                await ws.send_json(
-                                    {
-                                        "type": "error",
-                                        "message": f"No valid audio data for agent {agent_name}",
-                                    }
-                                )
-                            else:
-                                logger.info(
-                                    f"audio_delta: Sending {len(audio_b64)} bytes for agent {agent_name}"
-                                )
-                                await ws.send_json(
-                                    {
-                                        "type": "audio_delta",
-                                        "audio": audio_b64,
-                                        "item_id": getattr(
-                                            payload, "item_id", None
-                                        ),
-                                    }
-                                )
-                        case "user_audio_started":
-                            await ws.send_json({"type": "user_audio_started"})
-                        case (
-                            "response.content_part.done"
-                            | "response.output_item.done"
-                            | "response.done"
-                        ):
-                            logger.info(
-                                f"Event type: {evt_type} (no frontend action)"
-                            )
-                        case "agent_switched":
-                            # Use TARGET_AGENT_FIELD from route_tool_module.schema_params
-                            schema_params = getattr(
-                                route_tool_module, "schema_params", {}
-                            )
-                            target_agent_field = schema_params.get(
-                                "TARGET_AGENT_FIELD", "target_agent"
-                            )
-                            target_agent = payload["params"].get(
-                                target_agent_field
-                            )
-                            input_item = payload["input_item"]
-                            output_item = payload["output_item"]
-                            previous_agent = self.session_current_agent.get(
-                                session_id
-                            )
-                            if (
-                                not target_agent
-                                or target_agent not in self.agent_configs
-                            ):
-                                logger.error(
-                                    f"Invalid target_agent in agent_switched event: {target_agent}"
-                                )
-                                output_item["output"] = (
-                                    f"Invalid target_agent: {target_agent}"
-                                )
-                                # Notify the previous agent about the error
-                                await self.active_sessions[session_id][
-                                    previous_agent
-                                ].notify_switch(
-                                    input_item=input_item,
-                                    output_item=output_item,
-                                    request_response=True,
-                                )
-                                await ws.send_json(
-                                    {
-                                        "type": "error",
-                                        "message": f"Invalid target_agent: {target_agent}",
-                                    }
-                                )
-                            else:
-                                await self._ensure_agent(
-                                    session_id, target_agent
-                                )
-                                self.session_current_agent[session_id] = (
-                                    target_agent
-                                )
-                                await ws.send_json(
-                                    {
-                                        "type": "agent_switched",
-                                        "agent_name": target_agent,
-                                        "session_id": session_id,
-                                    }
-                                )
-                                # Notify the previous agent of the switch
-                                await self.active_sessions[session_id][
-                                    previous_agent
-                                ].notify_switch(
-                                    input_item=input_item,
-                                    output_item=output_item,
-                                    request_response=False,
-                                )
-                                new_agent = self.active_sessions[session_id][
-                                    target_agent
-                                ]
-                                await new_agent.update_agent_instructions(
-                                    arguments=payload["params"],
-                                )
-                        case "error":
-                            logger.error(f"Agent error event: {payload}")
-                            await ws.send_json(
-                                {"type": "error", "message": str(payload)}
-                            )
-                        case _:
-                            await ws.send_json(
-                                {
-                                    "type": "unhandled_event",
-                                    "event": evt_type,
-                                    "payload": str(payload),
-                                }
-                            )
-                except Exception as e:
-                    logger.error(f"Error sending event to frontend: {e}")
-                    await ws.send_json({"type": "error", "message": str(e)})
+        )
         logger.info(
             f"consume_agent_events -> ended for session {session_id} agent {agent_name}"
         )
@@ -0,0 +1,95 @@
+import asyncio
+import base64
+from typing import Any, Awaitable, Callable, List, Optional
+from app.utils.metrics import metrics
+from app.utils.usage import b64_decoded_len
+
+
+def merge_b64(parts: List[str]) -> str:
+    """
+    Joins base64 chunks into one base64 string. Chunks without padding
+    can be concatenated as text; otherwise the bytes are re-encoded.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    if not any(part.endswith("=") for part in parts[:-1]):
+        return "".join(parts)
+    return base64.b64encode(
+        b"".join(base64.b64decode(part) for part in parts)
+    ).decode("ascii")
+
+
+class AudioCoalescer:
+    """
+    Merges consecutive audio deltas of one item into fewer downstream
+    frames. Buffered audio is sent when the item changes, when max_bytes
+    are buffered, when the oldest buffered delta is budget_ms old, or on
+    flush() (end of a response). discard() drops it (barge-in, where the
+    client would flush it from its playback queue anyway).
+
+    send(source, item_id, audio_b64, n_bytes) delivers one merged frame;
+    source is whatever the caller passed to add() (e.g. the agent).
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Any, str, str, int], Awaitable[None]],
+        budget_ms: float,
+        max_bytes: int,
+    ) -> None:
+        self.send = send
+        self.budget = budget_ms / 1000
+        self.max_bytes = max_bytes
+        self.source: Any = None
+        self.item_id: Optional[str] = None
+        self.parts: List[str] = []
+        self.size = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.timer_task: Optional[asyncio.Task] = None
+
+    async def add(self, source: Any, item_id: str, audio_b64: str) -> None:
+        if self.parts and (
+            item_id != self.item_id or source is not self.source
+        ):
+            await self.flush()
+        self.source = source
+        self.item_id = item_id
+        self.parts.append(audio_b64)
+        self.size += b64_decoded_len(audio_b64)
+        if self.size >= self.max_bytes:
+            await self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(
+                self.budget, self._on_timer
+            )
+
+    def _on_timer(self) -> None:
+        self.timer = None
+        if self.parts:
+            self.timer_task = asyncio.create_task(self.flush())
+
+    def _take(self) -> List[str]:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        parts, self.parts, self.size = self.parts, [], 0
+        return parts
+
+    async def flush(self) -> None:
+        size = self.size
+        parts = self._take()
+        if not parts:
+            return
+        metrics.increment("audio_deltas_coalesced", len(parts))
+        metrics.increment("audio_frames_sent")
+        await self.send(self.source, self.item_id, merge_b64(parts), size)
+
+    def discard(self) -> None:
+        parts = self._take()
+        if parts:
+            metrics.increment("audio_deltas_discarded", len(parts))
+
+    def close(self) -> None:
+        self.discard()
+        if self.timer_task is not None:
+            self.timer_task.cancel()
@@ -0,0 +1,23 @@
+from logging import Logger
+from typing import Any, Optional
+from app.utils.jsonl_sink import JsonlSink
+
+
+class ExportSink(JsonlSink):
+    """
+    Exports conversation records (transcripts, tool calls, agent switches)
+    for analytics to rotated export-*.jsonl files in directory, counted as
+    export_* metrics. Override _write_batch() to ship records somewhere
+    else.
+    """
+
+    def __init__(self, directory: str, logger: Logger, **kwargs: Any) -> None:
+        super().__init__(directory, logger, name="export", **kwargs)
+
+
+def create_export_sink(
+    directory: Optional[str], logger: Logger, **kwargs: Any
+) -> Optional[ExportSink]:
+    if not directory:
+        return None
+    return ExportSink(directory, logger=logger, **kwargs)
@@ -0,0 +1,109 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from logging import Logger
+from typing import Any, Dict, List, Optional
+from app.utils import json_codec
+from app.utils.metrics import metrics
+
+# Bump to invalidate every stored greeting after a format change
+CACHE_FORMAT_VERSION = 1
+
+
+def config_version(config: Any) -> str:
+    """
+    Hashes an agent config (tool objects excluded), so greetings cached for
+    it are invalidated when agents.json changes.
+    """
+    data = config.model_dump(exclude={"TOOL_LIST"})
+    encoded = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=8).hexdigest()
+
+
+@dataclass
+class CachedGreeting:
+    """
+    The response the model gave to a greeting prompt: its transcript (or
+    text) and, for audio agents, the base64 PCM16 audio deltas.
+    """
+
+    prompt: str
+    transcript: str
+    audio_deltas: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+
+
+class GreetingCache:
+    """
+    Stores greeting responses by key, in memory and optionally as JSON
+    files in a directory (shared across restarts). Entries older than
+    ttl seconds are ignored and evicted.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        directory: Optional[str] = None,
+        ttl: float = 86400,
+    ) -> None:
+        self.logger = logger
+        self.directory = directory
+        self.ttl = ttl
+        self.entries: Dict[str, CachedGreeting] = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        encoded = json.dumps(
+            [CACHE_FORMAT_VERSION, *parts], sort_keys=True, default=str
+        )
+        return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"greeting_{key}.json")
+
+    def _expired(self, greeting: CachedGreeting) -> bool:
+        return time.time() - greeting.created_at > self.ttl
+
+    def _read(self, key: str) -> Optional[CachedGreeting]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return CachedGreeting(**json_codec.loads(f.read()))
+        except FileNotFoundError:
+            return None
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable greeting {key}: {e}")
+            return None
+
+    def _write(self, key: str, greeting: CachedGreeting) -> None:
+        path = self._path(key)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(json_codec.dumps_bytes(asdict(greeting)))
+        os.replace(f"{path}.tmp", path)
+
+    async def get(self, key: str) -> Optional[CachedGreeting]:
+        greeting = self.entries.get(key)
+        if greeting is None and self.directory:
+            greeting = await asyncio.to_thread(self._read, key)
+            if greeting is not None:
+                self.entries[key] = greeting
+        if greeting is not None and self._expired(greeting):
+            del self.entries[key]
+            greeting = None
+        metrics.increment(
+            "greeting_cache_hits" if greeting else "greeting_cache_misses"
+        )
+        return greeting
+
+    async def put(self, key: str, greeting: CachedGreeting) -> None:
+        self.entries[key] = greeting
+        if not self.directory:
+            return
+        try:
+            await asyncio.to_thread(self._write, key, greeting)
+        except OSError as e:
+            self.logger.error(f"Error storing greeting {key}: {e}")
@@ -0,0 +1,90 @@
+import json
+from typing import Any, Union
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+# orjson is used when installed; the standard library is the fallback
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def _default(obj: Any) -> Any:
+    """
+    Serializes objects the JSON backends do not handle natively, such as
+    the pydantic models used for Realtime API events.
+    """
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+if orjson is not None:
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default)
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj, default=_default).decode("utf-8")
+
+    def loads(data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+else:
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(
+            obj, default=_default, ensure_ascii=False, separators=(",", ":")
+        )
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return dumps(obj).encode("utf-8")
+
+    def loads(data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+def encode_frame(data: Any, binary: bool = False) -> Union[str, bytes]:
+    """
+    Encodes data as a WebSocket frame payload: bytes for binary frames
+    (skips the bytes -> str round trip) or str for text frames.
+    """
+    return dumps_bytes(data) if binary else dumps(data)
+
+
+async def send_frame(websocket: WebSocket, frame: Union[str, bytes]) -> None:
+    """
+    Writes an already encoded frame to the socket.
+    """
+    if isinstance(frame, bytes):
+        await websocket.send({"type": "websocket.send", "bytes": frame})
+    else:
+        await websocket.send({"type": "websocket.send", "text": frame})
+
+
+async def send_json(
+    websocket: WebSocket, data: Any, binary: bool = False
+) -> None:
+    """
+    Encodes data once and writes it to the socket.
+    """
+    await send_frame(websocket, encode_frame(data, binary=binary))
+
+
+async def receive_json(websocket: WebSocket) -> Any:
+    """
+    Receives a text or binary frame and decodes it as JSON.
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    data = message.get("text")
+    if data is None:
+        data = message.get("bytes")
+    return loads(data)
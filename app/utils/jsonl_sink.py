@@ -0,0 +1,141 @@
+import asyncio
+import gzip
+import os
+import time
+from collections import deque
+from logging import Logger
+from typing import Any, Deque, Dict, List, Optional
+from app.utils import json_codec
+from app.utils.metrics import metrics
+
+
+class JsonlSink:
+    """
+    Writes records as JSON lines without blocking the event loop. write()
+    only appends to a bounded in-memory buffer; a background task drains it
+    in batches, every flush_interval seconds or as soon as batch_size
+    records are waiting, and encodes and writes them in a worker thread
+    (which also creates the directory). Records arriving while the buffer
+    is full are dropped and counted, so a slow disk never delays a session.
+    The task only runs while records are waiting.
+
+    With filename every batch is appended to that one file in directory;
+    otherwise files named <name>-<time>-<pid>-<n>.jsonl are rotated once
+    they reach rotate_bytes or rotate_interval seconds. compress writes
+    gzip members. Metrics are counted as <name>_records_written, _failed
+    and _dropped, and <name>_batches_written. Override _write_batch() to
+    ship records somewhere else.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        logger: Logger,
+        name: str = "records",
+        filename: Optional[str] = None,
+        max_buffer: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        rotate_bytes: int = 64 * 1024 * 1024,
+        rotate_interval: float = 3600,
+        compress: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.logger = logger
+        self.name = name
+        self.filename = filename
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval = rotate_interval
+        self.compress = compress
+        self.buffer: Deque[Dict[str, Any]] = deque()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        # Current output file, when it was opened and bytes written to it
+        self.path: Optional[str] = None
+        self.opened_at = 0.0
+        self.file_bytes = 0
+        self.file_count = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self.closed:
+            return
+        if len(self.buffer) >= self.max_buffer:
+            metrics.increment(f"{self.name}_records_dropped")
+            return
+        self.buffer.append(record)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        if len(self.buffer) >= self.batch_size:
+            self.wakeup.set()
+
+    async def _run(self) -> None:
+        # Returns once the buffer is drained; write() starts it again
+        while self.buffer:
+            if not self.closed:
+                try:
+                    await asyncio.wait_for(
+                        self.wakeup.wait(), self.flush_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            self.wakeup.clear()
+            await self._flush()
+
+    async def _flush(self) -> None:
+        while self.buffer:
+            n = min(len(self.buffer), self.batch_size)
+            batch = [self.buffer.popleft() for _ in range(n)]
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except (OSError, TypeError, ValueError) as e:
+                self.logger.error(
+                    f"Error writing {n} {self.name} records: {e}"
+                )
+                metrics.increment(f"{self.name}_records_failed", n)
+                continue
+            metrics.increment(f"{self.name}_records_written", n)
+            metrics.increment(f"{self.name}_batches_written")
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        data = "".join(json_codec.dumps(r) + "\n" for r in batch).encode()
+        if self.compress:
+            data = gzip.compress(data)
+        with open(self._current_path(), "ab") as f:
+            f.write(data)
+        self.file_bytes += len(data)
+
+    def _current_path(self) -> str:
+        if self.path is None:
+            os.makedirs(self.directory, exist_ok=True)
+        if self.filename:
+            self.path = os.path.join(self.directory, self.filename)
+            return self.path
+        now = time.time()
+        if (
+            self.path is None
+            or self.file_bytes >= self.rotate_bytes
+            or now - self.opened_at >= self.rotate_interval
+        ):
+            self.file_count += 1
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now))
+            suffix = ".jsonl.gz" if self.compress else ".jsonl"
+            self.path = os.path.join(
+                self.directory,
+                f"{self.name}-{stamp}-{os.getpid()}-{self.file_count}{suffix}",
+            )
+            self.opened_at = now
+            self.file_bytes = 0
+        return self.path
+
+    async def close(self) -> None:
+        """
+        Stops accepting records and writes out what is buffered.
+        """
+        self.closed = True
+        self.wakeup.set()
+        if self.task is not None and not self.task.done():
+            await self.task
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import sys
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from logging import Logger
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.utils.metrics import metrics
+
+# (session_id, agent_name, event) being handled by the current task
+current_step: ContextVar[Optional[Tuple[str, Optional[str], str]]] = (
+    ContextVar("current_step", default=None)
+)
+
+
+def set_loop_step(
+    session_id: str, agent_name: Optional[str], event: Optional[str]
+) -> None:
+    """
+    Attributes the current task's work to a session, agent and event until
+    the next call.
+    """
+    current_step.set((session_id, agent_name, event or "unknown"))
+
+
+class LoopMonitor:
+    """
+    Samples event-loop lag and detects slow callbacks: every callback run
+    by the loop is timed, and one exceeding the threshold is attributed to
+    the step (session, agent, event) its task was handling.
+
+    Slow-callback detection wraps asyncio.Handle._run, so it only applies
+    to the standard asyncio loop (not uvloop); lag sampling works with any
+    loop.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        lag_interval: float = 0.25,
+        slow_callback_ms: float = 50.0,
+        history: int = 50,
+    ) -> None:
+        self.logger = logger
+        self.lag_interval = lag_interval
+        self.slow_callback_s = slow_callback_ms / 1000
+        self.slow_callbacks: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.max_lag = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self._original_run = None
+
+    def start(self) -> None:
+        if self.task is not None:
+            return
+        self._patch_handles()
+        self.task = asyncio.create_task(self._sample_lag())
+
+    async def stop(self) -> None:
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _sample_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, loop.time() - start - self.lag_interval)
+            metrics.observe("loop_lag_seconds", lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.slow_callback_s:
+                last = self.slow_callbacks[-1] if self.slow_callbacks else None
+                self.logger.warning(
+                    f"Event loop lagged {lag * 1000:.0f}ms "
+                    f"(last slow callback: {last})"
+                )
+
+    def _patch_handles(self) -> None:
+        original = asyncio.events.Handle._run
+        self._original_run = original
+        threshold = self.slow_callback_s
+        monitor = self
+
+        def _run(handle):
+            context = getattr(handle, "_context", None)
+            before = context.get(current_step) if context else None
+            start = time.perf_counter()
+            try:
+                return original(handle)
+            finally:
+                duration = time.perf_counter() - start
+                if duration >= threshold:
+                    step = before or (
+                        context.get(current_step) if context else None
+                    )
+                    monitor._record_slow_callback(handle, duration, step)
+
+        asyncio.events.Handle._run = _run
+
+    def _record_slow_callback(
+        self,
+        handle: Any,
+        duration: float,
+        step: Optional[Tuple[str, Optional[str], str]],
+    ) -> None:
+        session_id, agent_name, event = step or (None, None, None)
+        record = {
+            "ts": time.time(),
+            "duration_ms": round(duration * 1000, 1),
+            "session_id": session_id,
+            "agent": agent_name,
+            "event": event,
+            "callback": _describe_callback(handle),
+        }
+        self.slow_callbacks.append(record)
+        metrics.increment("slow_callbacks")
+        metrics.observe("slow_callback_seconds", duration)
+        self.logger.warning(
+            f"Slow callback {record['duration_ms']}ms "
+            f"session={session_id} agent={agent_name} event={event}"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lag_interval_s": self.lag_interval,
+            "slow_callback_ms": self.slow_callback_s * 1000,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "slow_callbacks": list(self.slow_callbacks),
+        }
+
+
+def _describe_callback(handle: Any) -> str:
+    callback = getattr(handle, "_callback", handle)
+    # Task steps show up as Task.__step/task_wakeup; name the coroutine
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        name = getattr(coro, "__qualname__", None) or repr(coro)
+        return f"task {owner.get_name()} ({name})"
+    return repr(callback)[:200]
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(
+    thread_id: int, seconds: float, interval: float = 0.005
+) -> List[str]:
+    """
+    Samples the stack of a thread and returns a collapsed-stack profile
+    ("root;...;leaf count" lines, as read by flamegraph tools). Blocks for
+    `seconds`; run it in a worker thread.
+    """
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        if stack:
+            counts[";".join(reversed(stack))] += 1
+        del frame
+        time.sleep(interval)
+    return [f"{stack} {n}" for stack, n in counts.most_common()]
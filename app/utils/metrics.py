@@ -0,0 +1,59 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict
+
+
+@dataclass
+class TimingStats:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    last: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "last": round(self.last, 6),
+        }
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and timings, exposed by the /metrics route.
+    Safe to update from worker threads.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        self.timings: Dict[str, TimingStats] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            stats = self.timings.get(name)
+            if stats is None:
+                stats = self.timings[name] = TimingStats()
+            stats.observe(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "timings": {k: v.to_dict() for k, v in self.timings.items()},
+            }
+
+
+metrics = MetricsRegistry()
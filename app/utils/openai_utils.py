@@ -1,5 +1,5 @@
 from logging import Logger
-from typing import Tuple
+from typing import Any, Dict, List, Tuple
 
 from openai.types.beta.realtime.realtime_server_event import (
     RealtimeServerEvent,
@@ -10,8 +10,8 @@ from openai.types.beta.realtime.conversation_item_param import (
 from openai.types.beta.realtime.conversation_item_content_param import (
     ConversationItemContentParam,
 )
-from openai.resources.beta.realtime.realtime import AsyncRealtimeConnection
 from openai import AsyncOpenAI
+from app.utils.upstream_sender import UpstreamSender
 
 
 def extract_event_details(
@@ -53,21 +53,58 @@ def create_user_message_item(
         return None
 
 
-async def send_user_message(
+def create_history_message_item(
+    role: str, text: str, logger: Logger
+) -> ConversationItemParam:
+    """
+    Creates a completed user or assistant message item used to restore
+    conversation history on a new connection.
+    """
+    try:
+        content_type = "input_text" if role == "user" else "text"
+        content = ConversationItemContentParam(text=text, type=content_type)
+        return ConversationItemParam(
+            type="message",
+            role=role,
+            content=[content],
+            status="completed",
+        )
+    except Exception as e:
+        logger.error(f"Error creating history message item: {e}")
+        return None
+
+
+def item_create_event(item: ConversationItemParam) -> Dict[str, Any]:
+    return {"type": "conversation.item.create", "item": item}
+
+
+RESPONSE_CREATE_EVENT = {"type": "response.create"}
+
+
+def send_conversation_items(
+    items: List[ConversationItemParam],
+    sender: UpstreamSender,
+    logger: Logger,
+) -> None:
+    """
+    Inserts conversation items without requesting a response.
+    """
+    logger.info(f"Restoring {len(items)} conversation items")
+    sender.send_many(item_create_event(item) for item in items)
+
+
+def send_user_message(
     conversation_item: ConversationItemParam,
-    connection: AsyncRealtimeConnection,
+    sender: UpstreamSender,
     logger: Logger,
 ) -> None:
     """
-    Sends a user message to the server.
+    Queues a user message and a response request.
     """
-    try:
-        logger.info("Sending user message to server")
-        await connection.conversation.item.create(item=conversation_item)
-        await connection.response.create()
-        logger.info("User message sent to server")
-    except Exception as e:
-        logger.error(f"Error sending user message to server: {e}")
+    logger.info("Sending user message to server")
+    sender.send_many(
+        (item_create_event(conversation_item), RESPONSE_CREATE_EVENT)
+    )
 
 
 def create_tool_input_item(
@@ -135,42 +172,39 @@ def create_tool_input_output_items(
     return input_item, output_item
 
 
-async def send_tool_call_results(
+def send_tool_call_results(
     input_item: ConversationItemParam,
     output_item: ConversationItemParam,
-    connection: AsyncRealtimeConnection,
+    sender: UpstreamSender,
     logger: Logger,
 ) -> None:
     """
-    Sends the results of a tool call to the server and requests a response.
+    Queues the results of a tool call and a response request; the three
+    events are written back-to-back.
     """
-    try:
-        logger.info("Sending tool call results to server")
-        await connection.conversation.item.create(item=input_item)
-        await connection.conversation.item.create(item=output_item)
-        logger.info("Tool call results sent to server")
-        await connection.response.create()
-        logger.info("Tool call response request sent to server")
-    except Exception as e:
-        logger.error(f"Error sending tool call results to server: {e}")
+    logger.info("Sending tool call results to server")
+    sender.send_many(
+        (
+            item_create_event(input_item),
+            item_create_event(output_item),
+            RESPONSE_CREATE_EVENT,
+        )
+    )
 
 
-async def send_tool_call_results_without_response_request(
+def send_tool_call_results_without_response_request(
     input_item: ConversationItemParam,
     output_item: ConversationItemParam,
-    connection: AsyncRealtimeConnection,
+    sender: UpstreamSender,
     logger: Logger,
 ) -> None:
     """
-    Sends the results of a tool call to the server without requesting a response.
+    Queues the results of a tool call without requesting a response.
     """
-    try:
-        logger.info("Sending tool call results to server")
-        await connection.conversation.item.create(item=input_item)
-        await connection.conversation.item.create(item=output_item)
-        logger.info("Tool call results sent to server.")
-    except Exception as e:
-        logger.error(f"Error sending tool call results to server: {e}")
+    logger.info("Sending tool call results to server")
+    sender.send_many(
+        (item_create_event(input_item), item_create_event(output_item))
+    )
 
 
 def get_client() -> AsyncOpenAI:
@@ -0,0 +1,65 @@
+from typing import Any, Dict
+from app.utils import json_codec
+
+
+class PartialJSONObjectParser:
+    """
+    Incrementally parses a JSON object streamed in arbitrary chunks and
+    exposes each top-level field as soon as its value is complete.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._segment_start = -1
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """
+        Appends a chunk and returns the fields completed by it.
+        """
+        self.text += chunk
+        completed: Dict[str, Any] = {}
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._segment_start = i + 1
+            elif ch in "}]":
+                if self._depth == 1:
+                    self._complete_segment(text, i, completed)
+                self._depth -= 1
+            elif ch == "," and self._depth == 1:
+                self._complete_segment(text, i, completed)
+                self._segment_start = i + 1
+        self._pos = len(text)
+        return completed
+
+    def _complete_segment(
+        self, text: str, end: int, completed: Dict[str, Any]
+    ) -> None:
+        start = self._segment_start
+        segment = text[start:end]
+        if not segment.strip():
+            return
+        try:
+            parsed = json_codec.loads("{" + segment + "}")
+        except ValueError:
+            return
+        self.fields.update(parsed)
+        completed.update(parsed)
@@ -0,0 +1,213 @@
+import base64
+import os
+import queue
+import struct
+import threading
+import time
+from logging import Logger
+from typing import Any, Dict, Optional, Tuple
+from app.utils.metrics import metrics
+
+# PCM16 mono at 24 kHz, the Realtime API audio format
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+WAV_HEADER_SIZE = 44
+RECORDING_CHANNELS = ("caller", "agent")
+
+
+def wav_header(n_frames: int, channels: int) -> bytes:
+    block_align = channels * SAMPLE_WIDTH
+    data_size = n_frames * block_align
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,
+        channels,
+        SAMPLE_RATE,
+        SAMPLE_RATE * block_align,
+        block_align,
+        SAMPLE_WIDTH * 8,
+        b"data",
+        data_size,
+    )
+
+
+class WavTrack:
+    """
+    A PCM16 WAV file written at arbitrary frame offsets. The file grows in
+    preallocated chunks (gaps read back as silence) and the header is
+    written once, at close.
+    """
+
+    def __init__(
+        self, path: str, channels: int, chunk_seconds: float = 10.0
+    ) -> None:
+        self.path = path
+        self.channels = channels
+        self.block_align = channels * SAMPLE_WIDTH
+        self.chunk_bytes = int(SAMPLE_RATE * chunk_seconds) * self.block_align
+        self.n_frames = 0
+        self.allocated = WAV_HEADER_SIZE
+        self.file = open(path, "w+b")
+        self._ensure_size(WAV_HEADER_SIZE + self.chunk_bytes)
+
+    def _ensure_size(self, size: int) -> None:
+        if size <= self.allocated:
+            return
+        chunks = -(-(size - self.allocated) // self.chunk_bytes)
+        self.allocated += chunks * self.chunk_bytes
+        self.file.truncate(self.allocated)
+
+    def write_at(self, frame: int, channel: int, pcm: bytes) -> None:
+        n = len(pcm) // SAMPLE_WIDTH
+        size = n * SAMPLE_WIDTH
+        offset = WAV_HEADER_SIZE + frame * self.block_align
+        end = offset + n * self.block_align
+        self._ensure_size(end)
+        self.file.seek(offset)
+        if self.channels == 1:
+            self.file.write(pcm[:size])
+        else:
+            # Interleave into the frames already holding the other channel
+            frames = bytearray(self.file.read(end - offset))
+            frames.extend(bytes(end - offset - len(frames)))
+            low = channel * SAMPLE_WIDTH
+            high = low + 1
+            stride = self.block_align
+            frames[low::stride] = pcm[0:size:2]
+            frames[high::stride] = pcm[1:size:2]
+            self.file.seek(offset)
+            self.file.write(frames)
+        self.n_frames = max(self.n_frames, frame + n)
+
+    def close(self) -> None:
+        self.file.truncate(WAV_HEADER_SIZE + self.n_frames * self.block_align)
+        self.file.seek(0)
+        self.file.write(wav_header(self.n_frames, self.channels))
+        self.file.close()
+
+
+class SessionRecorder:
+    """
+    Records caller and agent audio of one session to WAV files from a
+    background thread. The live path only enqueues the base64 payloads it
+    already has (decoded once, in the writer thread); when the bounded queue
+    is full chunks are dropped and counted instead of blocking.
+
+    mode "split" writes <prefix>_caller.wav and <prefix>_agent.wav; mode
+    "mix" writes <prefix>.wav in stereo (caller left, agent right). Chunks
+    are placed by arrival time, or right after the previous chunk of the
+    same channel when audio arrives faster than real time. The files are
+    created and preallocated by the writer thread, off the event loop.
+    """
+
+    def __init__(
+        self,
+        path_prefix: str,
+        logger: Logger,
+        mode: str = "split",
+        queue_size: int = 512,
+    ) -> None:
+        self.path_prefix = path_prefix
+        self.logger = logger
+        self.mode = mode
+        self.started_at = time.monotonic()
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.dropped: Dict[str, int] = dict.fromkeys(RECORDING_CHANNELS, 0)
+        self.playheads: Dict[str, int] = dict.fromkeys(RECORDING_CHANNELS, 0)
+        # Opened by the writer thread; stays empty if that fails
+        self.tracks: Dict[str, Tuple[WavTrack, int]] = {}
+        self.thread = threading.Thread(
+            target=self._run, name=f"recorder-{path_prefix}", daemon=True
+        )
+        self.thread.start()
+
+    def write(self, channel: str, audio_b64: str) -> None:
+        """
+        Enqueues a base64 PCM16 chunk for a channel. Never blocks.
+        """
+        try:
+            self.queue.put_nowait((channel, time.monotonic(), audio_b64))
+        except queue.Full:
+            self.dropped[channel] += 1
+            metrics.increment("recording_dropped_chunks")
+
+    def _write_chunk(self, channel: str, ts: float, audio_b64: str) -> None:
+        pcm = base64.b64decode(audio_b64)
+        frame = int((ts - self.started_at) * SAMPLE_RATE)
+        frame = max(frame, self.playheads[channel])
+        track, index = self.tracks[channel]
+        track.write_at(frame, index, pcm)
+        self.playheads[channel] = frame + len(pcm) // SAMPLE_WIDTH
+
+    def _open_tracks(self) -> None:
+        directory = os.path.dirname(self.path_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.mode == "mix":
+            track = WavTrack(f"{self.path_prefix}.wav", channels=2)
+            self.tracks = {"caller": (track, 0), "agent": (track, 1)}
+            return
+        for name in RECORDING_CHANNELS:
+            path = f"{self.path_prefix}_{name}.wav"
+            self.tracks[name] = (WavTrack(path, channels=1), 0)
+
+    def _run(self) -> None:
+        try:
+            self._open_tracks()
+        except OSError as e:
+            self.logger.error(f"Error creating recording: {e}")
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if item[0] not in self.tracks:
+                continue
+            try:
+                self._write_chunk(*item)
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Error writing recording: {e}")
+        for track in {id(t): t for t, _ in self.tracks.values()}.values():
+            try:
+                track.close()
+            except OSError as e:
+                self.logger.error(f"Error closing recording: {e}")
+
+    def close(self) -> None:
+        """
+        Flushes queued chunks and finalizes the files. Blocks; call it from
+        a worker thread.
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": sorted({t.path for t, _ in self.tracks.values()}),
+            "seconds": {
+                name: round(head / SAMPLE_RATE, 3)
+                for name, head in self.playheads.items()
+            },
+            "dropped_chunks": dict(self.dropped),
+        }
+
+
+def create_recorder(
+    directory: Optional[str],
+    session_id: str,
+    logger: Logger,
+    mode: str = "split",
+    queue_size: int = 512,
+) -> Optional[SessionRecorder]:
+    if not directory:
+        return None
+    return SessionRecorder(
+        os.path.join(directory, session_id),
+        logger=logger,
+        mode=mode,
+        queue_size=queue_size,
+    )
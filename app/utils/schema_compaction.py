@@ -0,0 +1,167 @@
+import copy
+import json
+import logging
+import re
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+# tiktoken is used for exact counts when installed and its encoding can be
+# loaded (it may be downloaded on first use); otherwise tokens are estimated
+# at four characters each
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - depends on the environment
+    tiktoken = None
+
+# A plain logger: this module is imported while app.config (which
+# CustomLogger needs) is loading
+logger = logging.getLogger(__name__)
+_encoding = None
+_encoding_failed = False
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def _get_encoding() -> Any:
+    global _encoding, _encoding_failed
+    if _encoding is None and tiktoken is not None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            _encoding_failed = True
+            logger.warning(
+                f"Token encoding unavailable, estimating token counts: {e}"
+            )
+    return _encoding
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def _normalize(text: str) -> str:
+    return _NON_WORD.sub("", text).lower()
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(" ", 1)[0].rstrip(" ,;:.")
+    return cut + "…"
+
+
+def _compact_description(
+    text: str,
+    name: str,
+    strip: bool,
+    seen: Optional[set],
+    max_chars: Optional[int],
+) -> str:
+    if strip:
+        text = " ".join(text.split())
+        if _normalize(text) == _normalize(name):
+            return ""
+    if seen is not None:
+        kept = []
+        for sentence in _SENTENCE_END.split(text):
+            key = _normalize(sentence)
+            if key and key in seen:
+                continue
+            seen.add(key)
+            kept.append(sentence)
+        text = " ".join(kept)
+    if max_chars:
+        text = _shorten(text, max_chars)
+    return text
+
+
+def compact_tool_schema(
+    schema: Dict[str, Any],
+    strip: bool = True,
+    dedupe: bool = True,
+    max_description_chars: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Returns a copy of a function tool schema with smaller descriptions.
+    strip collapses whitespace and drops descriptions that are empty or
+    only repeat the tool or parameter name, dedupe removes sentences a
+    parameter repeats from the tool description or an earlier parameter,
+    and max_description_chars cuts descriptions at a word boundary.
+    Names, types, enums and required fields are left untouched.
+    """
+    schema = copy.deepcopy(schema)
+    seen: Optional[set] = set() if dedupe else None
+    schema["description"] = _compact_description(
+        schema.get("description") or "",
+        schema.get("name", ""),
+        strip,
+        seen,
+        max_description_chars,
+    )
+    properties = schema.get("parameters", {}).get("properties", {})
+    for name, prop in properties.items():
+        if strip:
+            prop.pop("title", None)
+        if "description" not in prop:
+            continue
+        description = _compact_description(
+            prop["description"] or "",
+            name,
+            strip,
+            seen,
+            max_description_chars,
+        )
+        if description or not strip:
+            prop["description"] = description
+        else:
+            del prop["description"]
+    return schema
+
+
+def tools_tokens(schemas: Optional[List[Dict[str, Any]]]) -> int:
+    if not schemas:
+        return 0
+    encoded = json.dumps(schemas, ensure_ascii=False, separators=(",", ":"))
+    return count_tokens(encoded)
+
+
+@dataclass
+class PromptFootprint:
+    """
+    Estimated input tokens an agent's session configuration adds to every
+    response: its instructions and its tool schemas, before and after
+    compaction.
+    """
+
+    agent: str
+    instructions_tokens: int
+    tools_tokens: int
+    tools_tokens_uncompacted: int
+
+    @property
+    def total_tokens(self) -> int:
+        return self.instructions_tokens + self.tools_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "total_tokens": self.total_tokens}
+
+
+def prompt_footprint(
+    agent: str,
+    instructions: Optional[str],
+    schemas: List[Dict[str, Any]],
+    compacted: Optional[List[Dict[str, Any]]] = None,
+) -> PromptFootprint:
+    return PromptFootprint(
+        agent=agent,
+        instructions_tokens=count_tokens(instructions),
+        tools_tokens=tools_tokens(
+            compacted if compacted is not None else schemas
+        ),
+        tools_tokens_uncompacted=tools_tokens(schemas),
+    )
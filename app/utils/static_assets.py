@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from logging import Logger
+from typing import Dict, Optional, Tuple
+from starlette.requests import Request
+from starlette.responses import Response
+
+# brotli is used when installed; gzip is always available
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+)
+# Smaller bodies are not worth the Content-Encoding overhead
+MIN_COMPRESS_SIZE = 512
+
+
+@dataclass
+class StaticAsset:
+    """
+    A file held in memory with its precompressed encodings
+    ("br"/"gzip" -> body).
+    """
+
+    content_type: str
+    body: bytes
+    digest: str
+    cache_control: str
+    encodings: Dict[str, bytes] = field(default_factory=dict)
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        # Each encoding is a distinct representation with its own tag
+        return (
+            f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+        )
+
+    def select(self, accept_encoding: str) -> Tuple[Optional[str], bytes]:
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.encodings and encoding in accepted:
+                return encoding, self.encodings[encoding]
+        return None, self.body
+
+
+class StaticAssetStore:
+    """
+    Loads every file of a directory once, hashes it and precompresses text
+    assets, then serves them from memory with ETag / If-None-Match (304)
+    and Cache-Control. No disk I/O happens per request.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        logger: Logger,
+        max_age: int = 3600,
+        no_cache: Tuple[str, ...] = ("index.html",),
+    ) -> None:
+        self.directory = directory
+        self.logger = logger
+        self.max_age = max_age
+        self.no_cache = set(no_cache)
+        self.assets: Dict[str, StaticAsset] = {}
+
+    def load(self) -> None:
+        assets: Dict[str, StaticAsset] = {}
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(
+                    os.sep, "/"
+                )
+                try:
+                    with open(path, "rb") as f:
+                        body = f.read()
+                except OSError as e:
+                    self.logger.error(
+                        f"Error loading static asset {name}: {e}"
+                    )
+                    continue
+                assets[name] = self._build(name, body)
+        self.assets = assets
+        raw = sum(len(a.body) for a in assets.values())
+        self.logger.info(
+            f"Loaded {len(assets)} static assets ({raw} bytes) into memory"
+        )
+
+    def _build(self, name: str, body: bytes) -> StaticAsset:
+        content_type = (
+            mimetypes.guess_type(name)[0] or "application/octet-stream"
+        )
+        if content_type.startswith("text/") or content_type in (
+            "application/javascript",
+            "application/json",
+        ):
+            content_type += "; charset=utf-8"
+        cache_control = (
+            "no-cache"
+            if name in self.no_cache
+            else f"public, max-age={self.max_age}"
+        )
+        asset = StaticAsset(
+            content_type=content_type,
+            body=body,
+            digest=hashlib.blake2b(body, digest_size=12).hexdigest(),
+            cache_control=cache_control,
+        )
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(
+            COMPRESSIBLE_TYPES
+        ):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                asset.encodings["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    asset.encodings["br"] = compressed
+        return asset
+
+    def response(self, request: Request, name: str) -> Optional[Response]:
+        """
+        Builds the response for an asset, or returns None if it is unknown.
+        """
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        encoding, body = asset.select(
+            request.headers.get("accept-encoding", "")
+        )
+        headers = {
+            "ETag": asset.etag(encoding),
+            "Cache-Control": asset.cache_control,
+        }
+        if asset.encodings:
+            headers["Vary"] = "Accept-Encoding"
+        if _etag_matches(request.headers.get("if-none-match"), asset):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(
+            content=body, media_type=asset.content_type, headers=headers
+        )
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _etag_matches(if_none_match: Optional[str], asset: StaticAsset) -> bool:
+    """
+    Any representation of the same content satisfies If-None-Match.
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        tag = tag.removeprefix("W/").strip('"')
+        if tag.split("-", 1)[0] == asset.digest:
+            return True
+    return False
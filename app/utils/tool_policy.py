@@ -0,0 +1,188 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from logging import Logger
+from typing import Any, Awaitable, Callable, Deque, Optional
+from app.utils.metrics import metrics
+
+
+@dataclass
+class ToolPolicy:
+    """
+    Execution policy of one tool: an overall deadline, retries with
+    exponential backoff, an optional hedged duplicate call, a fallback
+    output and a consecutive-failure circuit breaker.
+
+    The deadline covers every attempt. A call that fails, times out or is
+    rejected by an open breaker returns `fallback` when one is set and
+    raises otherwise. Hedging starts a second call when the first has not
+    finished after `hedge_after` seconds, or after the `hedge_percentile`
+    latency of recent successful calls once `hedge_min_samples` are known;
+    only enable it for idempotent tools.
+    """
+
+    timeout: Optional[float] = None
+    retries: int = 0
+    retry_delay: float = 0.1
+    fallback: Optional[str] = None
+    hedge_after: Optional[float] = None
+    hedge_percentile: Optional[float] = None
+    hedge_min_samples: int = 20
+    breaker_threshold: Optional[int] = None
+    breaker_reset: float = 30.0
+    # Latencies (seconds) of recent successful calls
+    latencies: Deque[float] = field(
+        default_factory=lambda: deque(maxlen=100), repr=False
+    )
+    # Consecutive failures, and when the breaker opened
+    failures: int = 0
+    opened_at: Optional[float] = None
+
+    async def execute(
+        self,
+        name: str,
+        call: Callable[[], Awaitable[Any]],
+        logger: Logger,
+        first: Optional[Awaitable[Any]] = None,
+    ) -> Any:
+        """
+        Runs call() under the policy. `first`, if given, is an already
+        started call (e.g. a prefetch) used as the first attempt.
+        """
+        if not self._allow():
+            _count("breaker_rejections", name)
+            if first is not None:
+                asyncio.ensure_future(first).cancel()
+            return self._fail(
+                name, RuntimeError(f"{name} is unavailable (circuit open)")
+            )
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                self._attempts(name, call, logger, first), self.timeout
+            )
+        except asyncio.TimeoutError:
+            _count("timeouts", name)
+            logger.warning(f"Tool {name} timed out after {self.timeout}s")
+            self._record_failure(name, logger)
+            return self._fail(
+                name, TimeoutError(f"{name} timed out after {self.timeout}s")
+            )
+        except Exception as e:
+            _count("errors", name)
+            self._record_failure(name, logger)
+            return self._fail(name, e)
+        duration = time.monotonic() - start
+        self.latencies.append(duration)
+        metrics.observe(f"tool_seconds_{name}", duration)
+        self._record_success(name, logger)
+        return result
+
+    async def _attempts(
+        self,
+        name: str,
+        call: Callable[[], Awaitable[Any]],
+        logger: Logger,
+        first: Optional[Awaitable[Any]],
+    ) -> Any:
+        for attempt in range(self.retries + 1):
+            if attempt:
+                _count("retries", name)
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                return await self._hedged(
+                    name, call, logger, first if attempt == 0 else None
+                )
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(
+                    f"Tool {name} failed (attempt {attempt + 1}): {e}"
+                )
+
+    async def _hedged(
+        self,
+        name: str,
+        call: Callable[[], Awaitable[Any]],
+        logger: Logger,
+        first: Optional[Awaitable[Any]],
+    ) -> Any:
+        primary = asyncio.ensure_future(first if first is not None else call())
+        delay = self._hedge_delay()
+        if delay is None:
+            return await primary
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                _count("hedges", name)
+                logger.info(f"Hedging tool {name} after {delay:.3f}s")
+                pending.add(asyncio.ensure_future(call()))
+            error: Optional[BaseException] = None
+            while done or pending:
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            _count("hedge_wins", name)
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _hedge_delay(self) -> Optional[float]:
+        if (
+            self.hedge_percentile is None
+            or len(self.latencies) < self.hedge_min_samples
+        ):
+            return self.hedge_after
+        ordered = sorted(self.latencies)
+        index = int(len(ordered) * self.hedge_percentile / 100)
+        return ordered[min(index, len(ordered) - 1)]
+
+    def _allow(self) -> bool:
+        # Once breaker_reset has passed, calls are let through again; the
+        # next failure re-opens the breaker
+        return (
+            self.opened_at is None
+            or time.monotonic() - self.opened_at >= self.breaker_reset
+        )
+
+    def _record_failure(self, name: str, logger: Logger) -> None:
+        self.failures += 1
+        if (
+            self.breaker_threshold is None
+            or self.failures < self.breaker_threshold
+        ):
+            return
+        if self.opened_at is None:
+            _count("breaker_opened", name)
+            logger.error(
+                f"Circuit opened for tool {name} after "
+                f"{self.failures} consecutive failures"
+            )
+        self.opened_at = time.monotonic()
+
+    def _record_success(self, name: str, logger: Logger) -> None:
+        self.failures = 0
+        if self.opened_at is not None:
+            logger.info(f"Circuit closed for tool {name}")
+            self.opened_at = None
+
+    def _fail(self, name: str, error: Exception) -> Any:
+        if self.fallback is None:
+            raise error
+        _count("fallbacks", name)
+        return self.fallback
+
+
+def _count(kind: str, name: str) -> None:
+    metrics.increment(f"tool_{kind}")
+    metrics.increment(f"tool_{kind}_{name}")
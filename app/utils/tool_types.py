@@ -1,5 +1,7 @@
+import asyncio
 from dataclasses import dataclass
-from typing import Callable, Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, Tuple
+from app.utils.tool_policy import ToolPolicy
 
 
 @dataclass
@@ -8,6 +10,18 @@ class UserTool:
     name: str
     description: str = ""
     schema: Optional[Dict[str, Any]] = None
+    # Speculative execution: started once all prefetch_keys are streamed
+    prefetch: Optional[Callable[..., Any]] = None
+    prefetch_keys: Tuple[str, ...] = ()
+    # Deadline, retries, hedging, fallback and circuit breaker
+    policy: Optional[ToolPolicy] = None
+
+
+@dataclass
+class ToolPrefetch:
+    args: Dict[str, Any]
+    task: asyncio.Task
+    tool_name: str = ""
 
 
 @dataclass
@@ -1,12 +1,17 @@
-import json
 import asyncio
+import inspect
 from logging import Logger
 from pydantic import BaseModel, create_model, Field
 from inspect import signature, Parameter
 from typing import Callable, Dict, Any, List, Tuple, Union, Optional
-from app.utils.tool_types import UserTool, RouteTool
+from app.utils import json_codec
+from app.utils.tool_policy import ToolPolicy
+from app.utils.tool_types import UserTool, RouteTool, ToolPrefetch
 from functools import wraps
 
+# Reserved parameter that receives the result of a custom prefetch hook
+PREFETCH_ARG = "prefetched"
+
 
 def extract_function_description(func: Callable) -> str:
     docstring = func.__doc__
@@ -37,6 +42,8 @@ def create_pydantic_model_with_descriptions(func: Callable) -> BaseModel:
     fields = {}
 
     for param_name, param in sig.parameters.items():
+        if param_name == PREFETCH_ARG:
+            continue
         if param.annotation != Parameter.empty:
             field_type = param.annotation
         else:
@@ -77,6 +84,21 @@ def get_tool_schema_from_tool_and_model(
     }
 
 
+def describe_route_targets(
+    description: str,
+    agent_names: Optional[List[str]],
+    agent_descriptions: Optional[Dict[str, str]],
+) -> str:
+    described = [
+        f"{name}: {agent_descriptions[name]}"
+        for name in agent_names or []
+        if agent_descriptions and agent_descriptions.get(name)
+    ]
+    if not described:
+        return description
+    return " ".join(filter(None, [description, "; ".join(described) + "."]))
+
+
 def build_route_schema(
     fields: Dict[str, str],
     current_agent_field: str,
@@ -96,24 +118,14 @@ def build_route_schema(
     properties = {}
     for name, desc in fields.items():
         if name == target_agent_field:
-            # Use anyOf for agent selection, including agent descriptions; fallback enum commented
+            # The enum lists the allowed targets; their descriptions go in
+            # the field description
             properties[name] = {
                 "type": "string",
-                # "anyOf": [
-                #     {
-                #         "const": agent_name,
-                #         # "title": agent_name,
-                #         "description": (
-                #             agent_descriptions.get(agent_name, "")
-                #             if agent_descriptions
-                #             else ""
-                #         ),
-                #     }
-                #     for agent_name in (agent_names or [])
-                # ],
                 "enum": agent_names,
-                "description": desc,
-                # "enum": agent_names,
+                "description": describe_route_targets(
+                    desc, agent_names, agent_descriptions
+                ),
             }
         else:
             properties[name] = {
@@ -172,19 +184,93 @@ def validate_args_against_schema(
         return False, ["Error validating schema"]
 
 
-def user_tool(func: Callable) -> UserTool:
-    """Decorator to register a function as a UserTool."""
+def user_tool(
+    func: Optional[Callable] = None,
+    *,
+    prefetch: Optional[Callable] = None,
+    prefetch_keys: Optional[List[str]] = None,
+    timeout: Optional[float] = None,
+    retries: int = 0,
+    retry_delay: float = 0.1,
+    fallback: Optional[str] = None,
+    hedge_after: Optional[float] = None,
+    hedge_percentile: Optional[float] = None,
+    breaker_threshold: Optional[int] = None,
+    breaker_reset: float = 30.0,
+) -> Union[UserTool, Callable[[Callable], UserTool]]:
+    """Decorator to register a function as a UserTool.
+
+    Use it bare (``@user_tool``) or with options. With ``prefetch_keys`` the
+    call is started speculatively as soon as those arguments have been
+    streamed by the model: ``prefetch`` is invoked with them (the tool itself
+    when no hook is given, in which case the keys must cover every
+    required parameter). The final call reuses the prefetched result when
+    the tool itself was prefetched with identical arguments; a custom hook's
+    result is passed to the tool through its ``prefetched`` parameter.
+
+    ``timeout``, ``retries``, ``fallback``, ``hedge_after`` /
+    ``hedge_percentile`` and ``breaker_threshold`` set the tool's
+    ToolPolicy. Sync tools with a policy run in a worker thread so the
+    deadline can fire; a timed-out thread is abandoned, not killed.
+    """
+    policy = None
+    if (
+        any(
+            option is not None
+            for option in (
+                timeout,
+                fallback,
+                hedge_after,
+                hedge_percentile,
+                breaker_threshold,
+            )
+        )
+        or retries
+    ):
+        policy = ToolPolicy(
+            timeout=timeout,
+            retries=retries,
+            retry_delay=retry_delay,
+            fallback=fallback,
+            hedge_after=hedge_after,
+            hedge_percentile=hedge_percentile,
+            breaker_threshold=breaker_threshold,
+            breaker_reset=breaker_reset,
+        )
 
-    @wraps(func)
-    def wrapper(*args: Any, **kwargs: Any) -> Any:
-        return func(*args, **kwargs)
+    def decorator(f: Callable) -> UserTool:
+        if prefetch_keys and prefetch is None:
+            missing = _required_params(f) - set(prefetch_keys)
+            if missing:
+                raise ValueError(
+                    f"Tool '{f.__name__}' is prefetched without a hook, so "
+                    f"prefetch_keys must include {sorted(missing)}"
+                )
+        if policy is not None and not inspect.iscoroutinefunction(f):
 
-    # Generate and attach schema
-    return UserTool(
-        func=wrapper,
-        name=func.__name__,
-        description=extract_function_description(func),
-    )
+            @wraps(f)
+            async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                return await asyncio.to_thread(f, *args, **kwargs)
+
+        else:
+
+            @wraps(f)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                return f(*args, **kwargs)
+
+        # Generate and attach schema
+        return UserTool(
+            func=wrapper,
+            name=f.__name__,
+            description=extract_function_description(f),
+            prefetch=prefetch,
+            prefetch_keys=tuple(prefetch_keys or ()),
+            policy=policy,
+        )
+
+    if func is not None:
+        return decorator(func)
+    return decorator
 
 
 def route_tool(func: Callable) -> RouteTool:
@@ -219,22 +305,126 @@ def find_tool_by_name(
     return tool
 
 
+def _required_params(func: Callable) -> set:
+    return {
+        name
+        for name, param in signature(func).parameters.items()
+        if param.default is Parameter.empty
+        and param.kind
+        not in (Parameter.VAR_POSITIONAL, Parameter.VAR_KEYWORD)
+        and name != PREFETCH_ARG
+    }
+
+
+async def _call_tool_func(func: Callable, args: Dict[str, Any]) -> Any:
+    # The decorator wrappers are plain functions, so check the result rather
+    # than the function to support async tools and hooks
+    result = func(**args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def start_tool_prefetch(
+    tool_obj: UserTool,
+    args: Dict[str, Any],
+    logger: Logger,
+) -> ToolPrefetch:
+    """
+    Starts the prefetch hook (or the tool itself) for partially streamed
+    arguments and returns the in-flight handle.
+    """
+    logger.info(f"Prefetching UserTool {tool_obj.name} with {args}")
+    hook = tool_obj.prefetch or tool_obj.func
+    task = asyncio.create_task(_call_tool_func(hook, args))
+    return ToolPrefetch(args=args, task=task, tool_name=tool_obj.name)
+
+
+def discard_tool_prefetch(prefetch: ToolPrefetch, logger: Logger) -> None:
+    """
+    Cancels an unused prefetch and logs its failure, if it already failed.
+    """
+
+    def log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(
+                f"Discarded prefetch of {prefetch.tool_name} failed: "
+                f"{task.exception()}"
+            )
+
+    prefetch.task.cancel()
+    prefetch.task.add_done_callback(log_failure)
+
+
+async def _resolve_prefetch(
+    tool_obj: UserTool,
+    prefetch: ToolPrefetch,
+    args: Dict[str, Any],
+    logger: Logger,
+) -> Optional[asyncio.Task]:
+    """
+    Returns the speculative run of the tool to reuse, if any: it is reused
+    only when its arguments match the final ones. A custom hook's result is
+    injected as the PREFETCH_ARG parameter when the tool declares it.
+    """
+    if tool_obj.prefetch is None:
+        # The tool ran with the prefetch keys only, so its result stands for
+        # the final call when those match and no other argument was given
+        keys = tool_obj.prefetch_keys
+        same_keys = {k: args[k] for k in keys if k in args} == prefetch.args
+        if same_keys and args.keys() <= set(keys):
+            logger.info(f"Reusing prefetched result for {tool_obj.name}")
+            return prefetch.task
+        discard_tool_prefetch(prefetch, logger)
+        return None
+    # Wait without propagating our own cancellation into the hook; a hook
+    # cancelled elsewhere (e.g. when its response ended) is just ignored
+    try:
+        await asyncio.wait({prefetch.task})
+    except asyncio.CancelledError:
+        prefetch.task.cancel()
+        raise
+    hook_result = None
+    if prefetch.task.cancelled():
+        logger.warning(f"Prefetch hook for {tool_obj.name} was cancelled")
+    elif prefetch.task.exception() is not None:
+        logger.warning(
+            f"Prefetch hook for {tool_obj.name} failed: "
+            f"{prefetch.task.exception()}"
+        )
+    else:
+        hook_result = prefetch.task.result()
+    if PREFETCH_ARG in signature(tool_obj.func).parameters:
+        args[PREFETCH_ARG] = hook_result
+    return None
+
+
 async def handle_user_tool_call(
     tool_obj: UserTool,
     arguments: str,
     logger: Logger,
+    prefetch: Optional[ToolPrefetch] = None,
 ) -> str:
     """
     Handles the logic for UserTool objects and returns the result.
     """
     try:
         logger.info(f"Invoking UserTool: {tool_obj.name}")
-        args = json.loads(arguments) if arguments else {}
-        result = (
-            await tool_obj.func(**args)
-            if asyncio.iscoroutinefunction(tool_obj.func)
-            else tool_obj.func(**args)
-        )
+        args = json_codec.loads(arguments) if arguments else {}
+        first = None
+        if prefetch is not None:
+            first = await _resolve_prefetch(tool_obj, prefetch, args, logger)
+        if tool_obj.policy is not None:
+            result = await tool_obj.policy.execute(
+                tool_obj.name,
+                lambda: _call_tool_func(tool_obj.func, args),
+                logger,
+                first=first,
+            )
+        elif first is not None:
+            result = await first
+        else:
+            result = await _call_tool_func(tool_obj.func, args)
         return str(result)
     except Exception as e:
         logger.error(f"Error executing UserTool {tool_obj.name}: {e}")
@@ -252,7 +442,7 @@ async def handle_route_tool_call(
     """
     try:
         logger.info(f"RouteTool call received: {tool_obj.name}")
-        args = json.loads(arguments) if arguments else {}
+        args = json_codec.loads(arguments) if arguments else {}
         # Route handling deferred to agent or caller
         correct_args, missing_fields = validate_args_against_schema(
             tool_obj.schema, args
@@ -268,11 +458,7 @@ async def handle_route_tool_call(
             )
 
         try:
-            _ = (
-                await tool_obj.func(**args)
-                if asyncio.iscoroutinefunction(tool_obj.func)
-                else tool_obj.func(**args)
-            )
+            _ = await _call_tool_func(tool_obj.func, args)
         except Exception as func_error:
             logger.warning(
                 f"Tool function '{tool_obj.name}' failed during execution: {func_error}"
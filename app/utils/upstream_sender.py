@@ -0,0 +1,88 @@
+import asyncio
+from collections import deque
+from logging import Logger
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+from openai.resources.beta.realtime.realtime import AsyncRealtimeConnection
+from app.utils.metrics import metrics
+
+AUDIO_APPEND = "input_audio_buffer.append"
+
+
+class UpstreamSender:
+    """
+    Single ordered writer for one upstream connection. Callers enqueue
+    client events without awaiting the socket; a background task writes
+    them back-to-back in enqueue order.
+
+    At most max_queued_audio audio appends wait in the queue: further ones
+    are dropped and counted while the upstream is stalled, so memory stays
+    bounded. Other events are never dropped. The first failed send stops
+    the writer and is reported through on_error (the agent closes the
+    connection and reconnects); close() returns the events that were never
+    written so the agent can resend them.
+    """
+
+    def __init__(
+        self,
+        connection: AsyncRealtimeConnection,
+        logger: Logger,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        max_queued_audio: int = 200,
+    ) -> None:
+        self.connection = connection
+        self.logger = logger
+        self.on_error = on_error
+        self.max_queued_audio = max_queued_audio
+        self.queue: Deque[Dict[str, Any]] = deque()
+        self.queued_audio = 0
+        self.wakeup = asyncio.Event()
+        # The event whose send failed; it heads the unsent events
+        self.failed: Optional[Dict[str, Any]] = None
+        self.task = asyncio.create_task(self._run())
+
+    def send(self, event: Dict[str, Any]) -> None:
+        if event.get("type") == AUDIO_APPEND:
+            if self.queued_audio >= self.max_queued_audio:
+                metrics.increment("upstream_audio_dropped")
+                return
+            self.queued_audio += 1
+        self.queue.append(event)
+        self.wakeup.set()
+
+    def send_many(self, events: Iterable[Dict[str, Any]]) -> None:
+        for event in events:
+            self.send(event)
+
+    async def _run(self) -> None:
+        while True:
+            if not self.queue:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            event = self.queue.popleft()
+            if event.get("type") == AUDIO_APPEND:
+                self.queued_audio -= 1
+            try:
+                await self.connection.send(event)
+            except Exception as e:
+                self.failed = event
+                metrics.increment("upstream_send_errors")
+                self.logger.error(
+                    f"Error sending {event.get('type')} upstream: {e}"
+                )
+                if self.on_error:
+                    self.on_error(e)
+                return
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        Stops the writer and returns the events it never wrote, oldest
+        first.
+        """
+        self.task.cancel()
+        unsent = list(self.queue)
+        if self.failed is not None:
+            unsent.insert(0, self.failed)
+        self.queue.clear()
+        self.queued_audio = 0
+        return unsent
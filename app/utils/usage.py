@@ -0,0 +1,131 @@
+import time
+from dataclasses import dataclass, asdict, fields
+from typing import Any, Dict, Optional
+from app.utils.jsonl_sink import JsonlSink
+
+# PCM16 mono at 24 kHz
+AUDIO_BYTES_PER_SECOND = 48000
+
+
+def b64_decoded_len(data: str) -> int:
+    """
+    Returns the number of bytes encoded by a base64 string without decoding.
+    """
+    if not data:
+        return 0
+    return len(data) * 3 // 4 - data[-2:].count("=")
+
+
+@dataclass
+class UsageStats:
+    responses: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    input_text_tokens: int = 0
+    input_audio_tokens: int = 0
+    input_cached_tokens: int = 0
+    output_text_tokens: int = 0
+    output_audio_tokens: int = 0
+    audio_bytes_sent: int = 0
+    audio_bytes_received: int = 0
+
+    def add(self, other: "UsageStats") -> None:
+        for f in fields(self):
+            setattr(
+                self, f.name, getattr(self, f.name) + getattr(other, f.name)
+            )
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["audio_seconds_sent"] = round(
+            self.audio_bytes_sent / AUDIO_BYTES_PER_SECOND, 3
+        )
+        data["audio_seconds_received"] = round(
+            self.audio_bytes_received / AUDIO_BYTES_PER_SECOND, 3
+        )
+        return data
+
+    @classmethod
+    def from_response_usage(cls, usage: Any) -> "UsageStats":
+        """
+        Builds stats from the `usage` object of a response.done event.
+        """
+        stats = cls(responses=1)
+        if usage is None:
+            return stats
+        stats.input_tokens = usage.input_tokens or 0
+        stats.output_tokens = usage.output_tokens or 0
+        stats.total_tokens = usage.total_tokens or 0
+        details = usage.input_token_details
+        if details:
+            stats.input_text_tokens = details.text_tokens or 0
+            stats.input_audio_tokens = details.audio_tokens or 0
+            stats.input_cached_tokens = details.cached_tokens or 0
+        details = usage.output_token_details
+        if details:
+            stats.output_text_tokens = details.text_tokens or 0
+            stats.output_audio_tokens = details.audio_tokens or 0
+        return stats
+
+
+class UsageTracker:
+    """
+    Aggregates usage for one session, broken down per agent and per tool
+    (a response requested by a tool result is attributed to that tool).
+    """
+
+    def __init__(
+        self, session_id: str, sink: Optional[JsonlSink] = None
+    ) -> None:
+        self.session_id = session_id
+        self.sink = sink
+        self.total = UsageStats()
+        self.by_agent: Dict[str, UsageStats] = {}
+        self.by_tool: Dict[str, UsageStats] = {}
+
+    def _agent(self, agent_name: str) -> UsageStats:
+        stats = self.by_agent.get(agent_name)
+        if stats is None:
+            stats = self.by_agent[agent_name] = UsageStats()
+        return stats
+
+    def record_response(
+        self,
+        agent_name: str,
+        response_id: Optional[str],
+        usage: Any,
+        tool_name: Optional[str] = None,
+    ) -> UsageStats:
+        stats = UsageStats.from_response_usage(usage)
+        self.total.add(stats)
+        self._agent(agent_name).add(stats)
+        if tool_name:
+            self.by_tool.setdefault(tool_name, UsageStats()).add(stats)
+        if self.sink:
+            record = {
+                "ts": time.time(),
+                "session_id": self.session_id,
+                "agent": agent_name,
+                "response_id": response_id,
+                "tool": tool_name,
+            }
+            record.update(asdict(stats))
+            self.sink.write(record)
+        return stats
+
+    def record_audio_sent(self, agent_name: str, n_bytes: int) -> None:
+        self.total.audio_bytes_sent += n_bytes
+        self._agent(agent_name).audio_bytes_sent += n_bytes
+
+    def record_audio_received(self, agent_name: str, n_bytes: int) -> None:
+        self.total.audio_bytes_received += n_bytes
+        self._agent(agent_name).audio_bytes_received += n_bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "total": self.total.to_dict(),
+            "agents": {k: v.to_dict() for k, v in self.by_agent.items()},
+            "tools": {k: v.to_dict() for k, v in self.by_tool.items()},
+        }
@@ -0,0 +1,74 @@
+"""
+Per-session memory footprint of idle sessions: the Session object, its
+usage tracker, resume buffer and reaper bookkeeping, as held by the
+service registry (no agents or upstream connections).
+
+Run from the repository root:
+
+    python -m benchmarks.session_memory --sessions 10000
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import tracemalloc
+import uuid
+from app.services.session import Session
+from app.services.session_reaper import SessionReaper
+from app.utils.usage import UsageTracker
+
+
+async def _noop(session_id: str, reason: str) -> None:
+    pass
+
+
+async def measure(n: int, outbox_size: int, outbox_events: int) -> None:
+    reaper = SessionReaper(
+        on_expire=_noop,
+        logger=logging.getLogger(__name__),
+        connect_timeout=3600,
+        resume_grace=30,
+    )
+    frame = '{"type":"response_text_delta","text":"Hola","seq":1}'
+    sessions = {}
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(n):
+        session_id = str(uuid.uuid4())
+        session = Session(
+            session_id,
+            usage=UsageTracker(session_id),
+            outbox_size=outbox_size,
+        )
+        session.current_agent = "default"
+        for seq in range(1, outbox_events + 1):
+            session.outbox.append((seq, frame))
+        session.seq = outbox_events
+        sessions[session_id] = session
+        reaper.track(session_id)
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    used = after - before
+    print(f"sessions:            {n}")
+    print(f"buffered events:     {outbox_events} of {outbox_size}")
+    print(f"total:               {used / 1024 / 1024:.2f} MiB")
+    print(f"per session:         {used / n:.0f} bytes")
+    print(f"peak:                {(peak - before) / 1024 / 1024:.2f} MiB")
+    if reaper.task:
+        reaper.task.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--outbox-size", type=int, default=256)
+    parser.add_argument("--outbox-events", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(measure(args.sessions, args.outbox_size, args.outbox_events))
+
+
+if __name__ == "__main__":
+    main()
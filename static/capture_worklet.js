@@ -0,0 +1,66 @@
+// Microphone capture processor.
+// Converts each render quantum to PCM16 on the audio thread, accumulates the
+// samples in a ring buffer and posts fixed-size frames to the main thread as
+// transferable Int16Array buffers (no copies, no per-chunk main-thread work).
+class CaptureProcessor extends AudioWorkletProcessor {
+  constructor(options) {
+    super();
+    const opts = (options && options.processorOptions) || {};
+    this.frameSize = Math.max(128, opts.frameSize || 2048);
+    // Room for several frames so a slow main thread never overwrites samples
+    this.capacity = this.frameSize * 8;
+    this.ring = new Int16Array(this.capacity);
+    this.readPos = 0;
+    this.writePos = 0;
+    this.available = 0;
+    this.port.onmessage = e => {
+      if (e.data && e.data.type === "flush") this.flush();
+    };
+  }
+
+  write(f32) {
+    for (let i = 0; i < f32.length; i++) {
+      let s = f32[i];
+      s = s < -1 ? -1 : s > 1 ? 1 : s;
+      this.ring[this.writePos] = s < 0 ? s * 0x8000 : s * 0x7fff;
+      this.writePos = (this.writePos + 1) % this.capacity;
+    }
+    this.available += f32.length;
+    if (this.available > this.capacity) {
+      // Overrun: drop the oldest samples
+      this.readPos = (this.readPos + this.available - this.capacity) % this.capacity;
+      this.available = this.capacity;
+    }
+  }
+
+  read(count) {
+    const out = new Int16Array(count);
+    const first = Math.min(count, this.capacity - this.readPos);
+    out.set(this.ring.subarray(this.readPos, this.readPos + first), 0);
+    if (first < count) out.set(this.ring.subarray(0, count - first), first);
+    this.readPos = (this.readPos + count) % this.capacity;
+    this.available -= count;
+    return out;
+  }
+
+  post(frame) {
+    this.port.postMessage({ type: "frame", pcm: frame.buffer }, [frame.buffer]);
+  }
+
+  flush() {
+    if (this.available > 0) this.post(this.read(this.available));
+  }
+
+  process(inputs) {
+    const input = inputs[0];
+    if (input && input[0]) {
+      this.write(input[0]);
+      while (this.available >= this.frameSize) {
+        this.post(this.read(this.frameSize));
+      }
+    }
+    return true;
+  }
+}
+
+registerProcessor("capture-processor", CaptureProcessor);
@@ -0,0 +1,113 @@
+// TTS playback processor with a jitter buffer.
+// PCM16 samples live in a ring buffer indexed by two monotonic counters:
+// ctrl[0] = total samples written, ctrl[1] = total samples consumed.
+// When the page is cross-origin isolated the ring is a SharedArrayBuffer
+// written directly by the main thread; otherwise chunks arrive as
+// transferable buffers over the port and the processor owns the ring.
+const WRITE = 0;
+const READ = 1;
+const POSITION_EVERY = 4;  // render quanta between position reports
+
+class PlaybackProcessor extends AudioWorkletProcessor {
+  constructor(options) {
+    super();
+    const opts = options.processorOptions;
+    this.capacity = opts.capacity;
+    this.shared = Boolean(opts.ctrl);
+    if (this.shared) {
+      this.ctrl = new Int32Array(opts.ctrl);
+      this.data = new Int16Array(opts.data);
+    } else {
+      this.ctrl = new Int32Array(2);
+      this.data = new Int16Array(this.capacity);
+    }
+    const perMs = opts.sampleRate / 1000;
+    this.targetSamples = Math.round(opts.targetMs * perMs);
+    this.minSamples = Math.round(opts.minMs * perMs);
+    this.playing = false;
+    this.underrun = false;
+    this.lastWrite = 0;
+    this.idleSamples = 0;
+    this.quanta = 0;
+    this.port.onmessage = e => {
+      const msg = e.data;
+      if (msg.type === "push") this.push(new Int16Array(msg.pcm));
+      else if (msg.type === "clear") this.clear(msg.upTo);
+    };
+  }
+
+  // Same overflow policy as the shared writer: samples that do not fit
+  // are dropped (only the reader may move the read counter)
+  push(pcm) {
+    const w = this.ctrl[WRITE];
+    const n = Math.min(pcm.length, this.capacity - (w - this.ctrl[READ]));
+    const start = w % this.capacity;
+    const first = Math.min(n, this.capacity - start);
+    this.data.set(pcm.subarray(0, first), start);
+    if (first < n) this.data.set(pcm.subarray(first, n), 0);
+    this.ctrl[WRITE] = w + n;
+    if (n < pcm.length) {
+      this.port.postMessage({ type: "dropped", samples: pcm.length - n });
+    }
+  }
+
+  clear(upTo) {
+    const w = Atomics.load(this.ctrl, WRITE);
+    const r = Atomics.load(this.ctrl, READ);
+    Atomics.store(this.ctrl, READ, Math.max(r, Math.min(upTo, w)));
+    this.playing = false;
+    this.underrun = false;
+    this.reportPosition();
+  }
+
+  reportPosition() {
+    if (!this.shared) {
+      this.port.postMessage({ type: "position", samples: this.ctrl[READ] });
+    }
+  }
+
+  process(inputs, outputs) {
+    const out = outputs[0][0];
+    const w = Atomics.load(this.ctrl, WRITE);
+    let r = Atomics.load(this.ctrl, READ);
+    if (w !== this.lastWrite) {
+      this.lastWrite = w;
+      this.idleSamples = 0;
+    } else {
+      this.idleSamples += out.length;
+    }
+    // Replies arrive faster than real time, so a deep buffer is normal:
+    // everything queued is played (the ring bounds memory) and READ only
+    // ever advances by played or cleared samples
+    const available = w - r;
+    if (!this.playing && available > 0) {
+      const threshold = this.underrun ? this.minSamples : this.targetSamples;
+      // Start once the buffer is primed, or when the stream has gone quiet
+      // (the tail of a response may be shorter than the target)
+      if (available >= threshold || this.idleSamples >= this.targetSamples) {
+        this.playing = true;
+      }
+    }
+    const startRead = r;
+    if (this.playing) {
+      const n = Math.min(out.length, available);
+      for (let i = 0; i < n; i++) {
+        out[i] = this.data[(r + i) % this.capacity] / 32768;
+      }
+      r += n;
+      if (n < out.length) {
+        this.playing = false;
+        // A drained buffer mid-stream is an underrun; after a long pause
+        // the next response starts fresh at the target depth
+        this.underrun = this.idleSamples < this.targetSamples;
+      }
+    }
+    Atomics.store(this.ctrl, READ, r);
+    if (r !== startRead && (++this.quanta % POSITION_EVERY === 0 || !this.playing)) {
+      this.reportPosition();
+    }
+    return true;
+  }
+}
+
+registerProcessor("playback-processor", PlaybackProcessor);